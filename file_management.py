@@ -6,6 +6,19 @@ import os as _os
 import time as _time
 import shutil as _shutil
 import functools as _functools
+import heapq as _heapq
+import concurrent.futures as _futures
+import itertools as _itertools
+import operator as _operator
+import collections as _collections
+import tempfile as _tempfile
+import json as _json
+import zlib as _zlib
+import math as _math
+import contextlib as _contextlib
+import threading as _threading
+import asyncio as _asyncio
+import sqlite3 as _sqlite3
 
 from . import litetools as _lt
 
@@ -13,7 +26,7 @@ import loguru as _loguru
 import tqdm as _tqdm
 
 
-FSDB_VERSION = "1.1.0"
+FSDB_VERSION = "1.2.0"
 FM_VERSION = "1.0.0-beta"
 
 
@@ -111,6 +124,10 @@ class ObjectFolder:
     def folder_status(self):
         return FolderStatus(self.root, self.status_database_dir)
 
+    def watch(self, stop: _typing.Callable[[], bool] | None = None):
+        """持续监视文件夹, 增量更新状态数据库(见FolderStatus.watch)"""
+        self.folder_status.watch(stop)
+
     @property
     def index_path(self) -> _pathlib.Path:
         key = "index_path"
@@ -126,12 +143,32 @@ class ObjectFolder:
         return self.__cache[key]
 
 
+class ScanEntry(_typing.NamedTuple):
+    """遍历文件夹得到的项目(path-like)"""
+
+    relpath: str  # 相对于根目录的路径
+    path: str  # 绝对路径
+    is_file: bool
+    stat: _os.stat_result | None  # 文件的stat(文件夹为None)
+
+    def __fspath__(self) -> str:
+        return self.path
+
+
 class FolderStatus:
     """文件夹变动追踪数据库"""
 
-    _t_path_sta = tuple[str, bool, str, int]
+    # PATH ISFILE SHA256 SIZE MTIME_NS CTIME_NS INODE DEV FINGERPRINT PENDING ALGO
+    # 前4项为路径的内容状态(VARIANCE表只记录这4项和ALGO), 之后4项为快速扫描使用的文件元数据,
+    # 之后2项为分层检测的抽样指纹, 以及sha256是否待校验(推迟了完整哈希的计算),
+    # 最后1项为SHA256列实际使用的哈希算法(见litetools.Hash.algorithms, 文件夹为None)
+    _t_path_sta = tuple[str, bool, str, int, int, int, int, int, str, bool, str]
     _t_list_sta = list[_t_path_sta]
-    _t_variance = tuple[str, bool, str, int, float, bool]
+    # PATH ISFILE SHA256 SIZE TIME CHANGE ALGO OLDPATH
+    # CHANGE: 0为删去, 1为新增, 2为移动(从OLDPATH移动到PATH, 内容不变)
+    _t_variance = tuple[str, bool, str, int, float, int, str, str | None]
+    _t_change_kind = _typing.Literal["added", "deleted", "modified", "moved"]
+    _t_change = tuple[_t_change_kind, _t_path_sta | None, _t_path_sta | None]
     _t_list_variance = list[_t_variance]
 
     _variance_column_name: tuple[str] = (
@@ -141,16 +178,129 @@ class FolderStatus:
         "SIZE",
         "TIME",
         "CHANGE",
+        "ALGO",
+        "OLDPATH",
+    )
+    _variance_table_define: list[tuple[str]] = [
+        ("PATH", "TEXT", "NOT NULL"),
+        ("ISFILE", "TINYINT", "NOT NULL"),
+        ("SHA256", "CHARACTER(64)"),
+        ("SIZE", "BIGINT"),
+        ("TIME", "DOUBLE", "NOT NULL"),
+        ("CHANGE", "TINYINT", "NOT NULL"),
+        ("ALGO", "TEXT"),
+        ("OLDPATH", "TEXT"),
+    ]
+    _status_column_name: tuple[str] = (
+        "PATH",
+        "ISFILE",
+        "SHA256",
+        "SIZE",
+        "MTIME_NS",
+        "CTIME_NS",
+        "INODE",
+        "DEV",
+        "FINGERPRINT",
+        "PENDING",
+        "ALGO",
     )
-    _status_column_name: tuple[str] = ("PATH", "ISFILE", "SHA256", "SIZE")
+    _status_table_define: list[tuple[str]] = [
+        ("PATH", "TEXT", "PRIMARY KEY"),
+        ("ISFILE", "TINYINT", "NOT NULL"),
+        ("SHA256", "CHARACTER(64)"),
+        ("SIZE", "BIGINT"),
+        ("MTIME_NS", "BIGINT"),
+        ("CTIME_NS", "BIGINT"),
+        ("INODE", "BIGINT"),
+        ("DEV", "BIGINT"),
+        ("FINGERPRINT", "TEXT"),
+        ("PENDING", "TINYINT"),
+        ("ALGO", "TEXT"),
+    ]
+    _status_table_options: str = "WITHOUT ROWID"
+    _index_define: list[tuple[str, str, str]] = [
+        # (索引名, 表名, 索引定义)
+        ("STATUS_SHA256", "STATUS", "(SHA256)"),
+        ("STATUS_SIZE_SHA256", "STATUS", "(SIZE, SHA256)"),
+        ("STATUS_PENDING", "STATUS", "(PATH) WHERE PENDING"),
+        ("VARIANCE_TIME", "VARIANCE", "(TIME)"),
+        ("VARIANCE_SHA256", "VARIANCE", "(SHA256)"),
+    ]
+    # 检查点: 某次更新后STATUS表内容状态的快照, 按PATH排序分块, 每块为zlib压缩的JSON
+    _checkpoint_column_name: tuple[str] = ("PATH", "ISFILE", "SHA256", "SIZE", "ALGO")
+    _checkpoint_table_define: list[tuple[str]] = [
+        ("TIME", "DOUBLE", "NOT NULL"),
+        ("CHUNK", "INTEGER", "NOT NULL"),
+        ("ROWS", "INTEGER", "NOT NULL"),
+        ("DATA", "BLOB", "NOT NULL"),
+    ]
+    _schema_version_table_define: list[tuple[str]] = [
+        ("VERSION", "TEXT", "PRIMARY KEY"),
+        ("TIME", "DOUBLE"),
+    ]
     _info_column_name: tuple[str] = ("TIME", "ROOT", "MAC", "COMMENT", "VERSION")
-
+    _meta_table_define: list[tuple[str]] = [("KEY", "TEXT", "PRIMARY KEY"), ("VALUE",)]
+
+    # 计算文件内容哈希(SHA256列)的算法, 可选litetools.Hash.algorithms中的算法(比如"blake2b", 安装后的"blake3"、"xxh3_128")
+    # 更换算法后, 未变动的文件沿用旧算法的哈希, 只有重新计算哈希的文件才使用新算法
+    # (启用litetools.Hash.cache后, 计算哈希前先查询本机共用的哈希缓存)
+    hash_algorithm: str = "sha256"
+    # 路径的存储方式(创建数据库时生效, 见layout_size_report):
+    # - "plain": STATUS表、VARIANCE表的每一行记录完整的相对路径
+    # - "normalized": 文件夹路径只在DIRS表中记录一次, 数据行只记录(文件夹ID, 名称),
+    #   STATUS、VARIANCE为拼接出完整路径的视图(可以照常查询、插入、删除), 数据库更小, 但按路径查询、排序更慢
+    path_layout: _typing.Literal["plain", "normalized"] = "plain"
+    # 数据库的连接配置(见litetools.DbOperator.profiles)。数据库位于文件夹内(.fmi), 文件夹可能在SMB/NFS上,
+    # 而WAL依赖共享内存, 在网络文件系统上不可用, 因此默认不使用; 确认在本地文件系统上时可改为"bulk-write"
+    db_profile: str = "default"
+    # 检查点(加速snapshot_at等历史查询): 每次更新后, 距上一个检查点的更新次数达到checkpoint_interval,
+    # 或VARIANCE记录数达到checkpoint_variance_rows时, 写入检查点(为None则不按该条件写入);
+    # 只保留最新的checkpoint_retention个检查点(为None则全部保留)
+    checkpoint_interval: int | None = None
+    checkpoint_variance_rows: int | None = 1_000_000
+    checkpoint_retention: int | None = 3
+    checkpoint_chunk_size: int = 65536  # 每块的行数
+    # 移动检测: 同一次更新中, 删去的文件与新增的文件内容(SHA256、SIZE、哈希算法)相同, 则记为移动
+    detect_moves: bool = True
     fast_scan: bool = True  # 快速扫描文件更改(如果为True, 则通过mtime、size等参数判断文件是否跳过计算哈希)
+    jobs: int = 1  # 扫描时的并发数(线程数或进程数), 小于1则使用CPU核心数
+    # 扫描的并发方式, 大量小文件时"process"更快;
+    # 高延迟的网络文件系统(SMB、NFS)上使用"asyncio": 以asyncio并发列出文件夹、stat项目(哈希计算与"thread"相同)
+    scan_backend: _typing.Literal["thread", "process", "asyncio"] = "thread"
+    # "asyncio"模式下同时进行的scandir/stat调用数, 以及预读(列出并stat)而尚未遍历到的文件夹数上限
+    # (文件夹剪枝时不预读子文件夹, 只并发stat文件夹内的项目)
+    async_concurrency: int = 64
+    async_readahead: int = 256
+    # 外部提供的执行器(比如BatchUpdate中多个文件夹共用的线程池, 由提供者关闭),
+    # 为None则每次扫描按scan_backend创建; 同时提交的任务数仍由jobs决定
+    executor: _futures.Executor | None = None
+    # 流式扫描时每批写入数据库的行数, 以及"process"模式下每个工作单元大约包含的项目数
+    # (旧状态不超过该数目的子树整体交给子进程列出、stat, 更大的文件夹由父进程展开)
+    work_unit_size: int = 4096
+    # 文件夹剪枝(需要fast_scan): 记录文件夹的mtime, 扫描时mtime未变的文件夹不再列出内容, 直接沿用STATUS表。
+    # 文件夹的mtime只在其中的项目增删、改名时变化, 因此被剪枝的子树只能发现项目的增删,
+    # 原地修改的文件内容要等到下一次完整遍历才会被发现; 距上次完整遍历超过full_walk_interval秒时自动完整遍历。
+    prune_unchanged_dirs: bool = False
+    full_walk_interval: float = 86400
+    # 分层检测(需要fast_scan): 文件元数据变化而size不变时, 先比较首、中、尾各一块的抽样指纹,
+    # 指纹不同则重新计算sha256; 指纹相同则推迟计算(沿用旧的sha256并记为待校验)。
+    # 每次更新后在verify_budget字节(None为不限)的预算内为待校验的文件计算sha256, 导出文件前全部校验。
+    tiered_verify: bool = False
+    fingerprint_block_size: int = 65536
+    verify_budget: int | None = 1 << 30
+    # 监视模式(见watch): 事件停止watch_settle秒后, 或距第一个未写入的事件超过watch_max_delay秒时,
+    # 将这段时间内变化的路径写入数据库
+    watch_settle: float = 1.0
+    watch_max_delay: float = 30.0
+    # 可继续的扫描: 扫描时至少每scan_progress_interval秒将已计算哈希的文件写入SCAN_PROGRESS表,
+    # 扫描被中断后, 下一次完整扫描沿用其中stat未变的文件的哈希(需要fast_scan)
+    scan_progress_interval: float = 60.0
 
     def __init__(
         self,
         folder_path: str | _pathlib.Path,
         dbpath: str | _pathlib.Path,
+        jobs: int | None = None,
     ) -> None:
         """
         Parameters
@@ -159,34 +309,135 @@ class FolderStatus:
             文件夹路径
         dbpath : str | pathlib.Path
             数据路径
+        jobs : int | None, default = None
+            扫描时的并发数, 为None则使用FolderStatus.jobs
         """
         self.__root = _pathlib.Path(folder_path).absolute()
         self.__dbpath = _pathlib.Path(dbpath).absolute()
         self.__cache = {}
+        # combine_variance创建的临时表, 返回的游标读取完之前不能删去
+        self.__combined_tables = []
+        self.__combined_serial = 0
+        if jobs is not None:
+            self.jobs = jobs
+
+    @staticmethod
+    def _change_kind(
+        path_sta_old: _t_path_sta | None, path_sta_new: _t_path_sta | None
+    ) -> _t_change_kind | None:
+        """
+        比较同一路径的新旧状态(只比较前4项内容状态和哈希算法, 不比较文件元数据)
+        哈希算法不同时无法比较内容, 视为"modified"
+
+        Parameters
+        ---
+        path_sta_old, path_sta_new : tuple | None
+            旧状态和新状态, 为None代表路径不存在
+
+        Returns
+        ---
+        "added" | "deleted" | "modified", 没有变化则返回None
+        """
+        if path_sta_old is None:
+            return None if path_sta_new is None else "added"
+        if path_sta_new is None:
+            return "deleted"
+        if (
+            path_sta_old[:4] == path_sta_new[:4]
+            and path_sta_old[10] == path_sta_new[10]
+        ):
+            return None
+        return "modified"
+
+    @classmethod
+    def _diff_pairs(
+        cls,
+        pairs: _typing.Iterable[tuple[_t_path_sta | None, _t_path_sta | None]],
+    ) -> _typing.Generator[_t_change, None, None]:
+        """将(旧状态, 新状态)序列转为变化序列(kind, 旧状态, 新状态), 跳过没有变化的路径"""
+        for path_sta_old, path_sta_new in pairs:
+            if (kind := cls._change_kind(path_sta_old, path_sta_new)) is not None:
+                yield kind, path_sta_old, path_sta_new
+
+    @classmethod
+    def diff_status(
+        cls,
+        old: _typing.Iterable[_t_path_sta],
+        new: _typing.Iterable[_t_path_sta],
+    ) -> _typing.Generator[_t_change, None, None]:
+        """
+        流式比较两个按PATH升序排列的路径状态序列(归并连接, 一次遍历, 额外内存O(1))
+
+        Parameters
+        ---
+        old, new : Iterable[tuple]
+            旧状态和新状态(比如按PATH排序的STATUS表、扫描结果)
+
+        Yields
+        ---
+        kind : "added" | "deleted" | "modified"
+            新增 | 删去 | 路径不变而内容(sha256等)变化
+        path_sta_old, path_sta_new : tuple | None
+            该路径的旧状态和新状态, 不存在的一侧为None
+        """
+        yield from cls._diff_pairs(_merge_join(old, new))
+
+    @staticmethod
+    def _pair_moves(changes: _typing.Iterable[_t_change]) -> list[_t_change]:
+        """
+        将变化中内容(SHA256、SIZE、哈希算法)相同的删去的文件和新增的文件配对为("moved", 旧状态, 新状态)
+        (与写入VARIANCE表时的移动检测一致: 同一内容的多个文件按路径顺序配对; 需要缓存全部变化)
+
+        Parameters
+        ---
+        changes : Iterable[tuple]
+            按路径排序的变化序列(见diff_status)
+
+        Returns
+        ---
+        按(新)路径排序的变化列表
+        """
+        changes = list(changes)
+        deleted: dict[tuple, _collections.deque] = _collections.defaultdict(
+            _collections.deque
+        )
+        for kind, path_sta_old, _ in changes:
+            if kind == "deleted" and path_sta_old[1] and path_sta_old[2] is not None:
+                key = (path_sta_old[2], path_sta_old[3], path_sta_old[10])
+                deleted[key].append(path_sta_old)
+
+        paired, moved_from = [], set()
+        for kind, path_sta_old, path_sta_new in changes:
+            if kind == "added" and path_sta_new[1]:
+                key = (path_sta_new[2], path_sta_new[3], path_sta_new[10])
+                if candidates := deleted.get(key):
+                    path_sta_old = candidates.popleft()
+                    moved_from.add(path_sta_old[0])
+                    kind = "moved"
+            paired.append((kind, path_sta_old, path_sta_new))
+        return [i for i in paired if not (i[0] == "deleted" and i[1][0] in moved_from)]
 
     @staticmethod
-    def __gene_variance(
-        list_old: _t_list_sta, list_new: _t_list_sta, time_: float
-    ) -> _t_list_variance:
+    def __gene_variance(change: _t_change, time_: float) -> _t_list_variance:
         """
-        获取两个列表的变化, 返回变化
+        将变化转为VARIANCE记录("modified"记为删去旧状态、新增新状态两条)
+
         Parameters
         ---
-        list_old, list_new : typing.Sequence
-            旧列表和新列表
+        change : tuple
+            (kind, 旧状态, 新状态)
+        time_ : float
+            更新时间
         """
-        set_old = set(list_old)
-        set_new = set(list_new)
-        added = set_new.difference(set_old)
-        deleted = set_old.difference(set_new)
-        added = [i + (time_, True) for i in added]
-        deleted = [i + (time_, False) for i in deleted]
-        variance = added + deleted
-        variance.sort()
+        _, path_sta_old, path_sta_new = change
+        variance = []
+        if path_sta_old is not None:
+            variance.append(path_sta_old[:4] + (time_, False, path_sta_old[10], None))
+        if path_sta_new is not None:
+            variance.append(path_sta_new[:4] + (time_, True, path_sta_new[10], None))
         return variance
 
     @staticmethod
-    @_loguru.logger.catch
     def _cal_sha256(file_path: _pathlib.Path) -> str | None:
         """
         Parameters
@@ -198,132 +449,723 @@ class FolderStatus:
         ---
         如果计算出错返回None, 否则返回sha256(Hex编码)
         """
-        hashobj = _hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(1048576), b""):
-                hashobj.update(byte_block)
-            return hashobj.hexdigest()
+        return FolderStatus._cal_hash(file_path, "sha256")
 
     @staticmethod
     @_loguru.logger.catch
-    def __get_file_size(file_path: _pathlib.Path) -> str | None:
+    def _cal_hash(file_path: _pathlib.Path, algorithm: str = "sha256") -> str | None:
         """
         Parameters
         ---
         file_path : _pathlib.Path
             指向文件的路径
+        algorithm : str, default = "sha256"
+            哈希算法(见litetools.Hash.algorithms)
 
         Returns
         ---
-        如果计算出错返回None, 否则返回文件大小
+        如果计算出错返回None, 否则返回哈希(Hex编码)
         """
-        return file_path.stat().st_size
+        return _lt.Hash.file_digest(file_path, algorithm)
 
+    @staticmethod
     @_loguru.logger.catch
-    def __calculating_path_status(self, path: _pathlib.Path) -> _t_path_sta:
+    def _cal_fingerprint(
+        file_path: str | _pathlib.Path, size: int, block_size: int
+    ) -> str:
         """
-        整合统计路径状态, 生成路径状态信息。
-        (所有文件都会计算sha256)
+        计算文件的抽样指纹: 文件大小, 以及首、中、尾各block_size字节的哈希
+        (文件不大于3 * block_size时即为整个文件的哈希)
 
         Parameters
         ---
-        path : pathlib.Path
-            路径
+        file_path : str | pathlib.Path
+            指向文件的路径
+        size : int
+            文件大小
+        block_size : int
+            抽样块的大小
+
+        Returns
+        ---
+        如果计算出错返回None, 否则返回指纹(Hex编码)
         """
-        relpath: str = str(path.relative_to(self.__root))
-        if path.is_file():
-            return (relpath, True, self._cal_sha256(path), self.__get_file_size(path))
-        else:
-            return (relpath, False, None, None)
+        hashobj = _hashlib.blake2b(str(size).encode(), digest_size=16)
+        with open(file_path, "rb") as f:
+            if size <= 3 * block_size:
+                hashobj.update(f.read())
+            else:
+                for offset in (0, (size - block_size) // 2, size - block_size):
+                    f.seek(offset)
+                    hashobj.update(f.read(block_size))
+        return hashobj.hexdigest()
 
-    @property
-    def __gene_path_status(self) -> _typing.Callable[[_pathlib.Path], _t_path_sta]:
-        """生成路径状态信息函数, 通过self.fast_scan判断是否使用快速生成"""
-        if not self.fast_scan:
-            return self.__calculating_path_status
-        else:
-            update_time_list: list[float] = [
-                i[0] for i in self._database.select("INFO", "TIME")
-            ]
-            last_update_time: float = max(update_time_list, default=0)
-            db_data: dict[str, self._t_path_sta] = {
-                i[0]: i for i in self._database.select("STATUS")
-            }
+    @staticmethod
+    @_loguru.logger.catch
+    def _gene_path_status_of(
+        entry: "ScanEntry",
+        db_path_data: _t_path_sta | None = None,
+        last_update_time: float = 0,
+        fingerprint_block: int | None = None,
+        algorithm: str = "sha256",
+    ) -> _t_path_sta:
+        """
+        整合统计路径状态, 生成路径状态信息。
+        如果提供了数据库中该路径的数据, 且size、mtime_ns、ctime_ns、inode、dev与数据库中完全一致,
+        则认为文件没有发生变动, 直接沿用数据库中的sha256(减少sha256计算量)。
+        (FSDB 1.1.0升级而来、尚未记录元数据的行, 则沿用旧的判断: mtime早于上次更新且size一致)
+        文件夹只有在遍历时进行了stat(文件夹剪枝)才记录元数据。
+        沿用数据库中的哈希时, 同时沿用其哈希算法; 重新计算的哈希使用algorithm。
 
-            @_loguru.logger.catch
-            def lazy_calculating_path_status(path: _pathlib.Path):
-                """
-                整合统计路径状态, 生成路径状态信息。
-                如果数据库中已有该文件的数据, 且通过mtime、size、is_file判断文件没有发生变动, 则直接返回数据库中的数据(减少sha256计算量)。
-
-                Parameters
-                ---
-                path : pathlib.Path
-                    路径
-                """
-                relpath: str = str(path.relative_to(self.__root))
-                if not path.is_file():
-                    return (relpath, False, None, None)
-                if db_path_data := db_data.get(relpath, None):
-                    _, db_isfile, _, db_size = db_path_data
-                else:
-                    return self.__calculating_path_status(path)
-
-                # 比对信息
-                stat = path.stat()
-                if (
-                    stat.st_mtime < last_update_time
-                    and stat.st_size == db_size
-                    and db_isfile == path.is_file()
-                ):
-                    return db_path_data
+        Parameters
+        ---
+        entry : ScanEntry
+            遍历得到的项目
+        db_path_data : tuple | None, default = None
+            数据库中该路径的数据, 为None则必定计算sha256
+        last_update_time : float, default = 0
+            数据库最后一次更新的时间
+        fingerprint_block : int | None, default = None
+            分层检测的抽样块大小, 为None则不进行分层检测(也不记录指纹)
+        algorithm : str, default = "sha256"
+            计算哈希的算法
+        """
+        stat = entry.stat
+        if stat is None:
+            if entry.is_file:
+                # 所在子树被剪枝(文件夹内没有增删), 沿用数据库中的数据
+                return db_path_data
+            return (entry.relpath, False) + (None,) * 9
+
+        path_stat = (stat.st_mtime_ns, stat.st_ctime_ns, stat.st_ino, stat.st_dev)
+        if not entry.is_file:
+            return (entry.relpath, False, None, None) + path_stat + (None,) * 3
+
+        size = stat.st_size
+        if db_path_data is not None:
+            _, db_isfile, db_sha256, db_size = db_path_data[:4]
+            db_path_stat = db_path_data[4:8]
+            db_fingerprint, db_pending, db_algo = db_path_data[8:11]
+            if db_isfile and db_sha256 and size == db_size:
+                if db_path_stat[0] is None:
+                    unchanged = stat.st_mtime < last_update_time
                 else:
-                    return self.__calculating_path_status(path)
+                    unchanged = db_path_stat == path_stat
+                if unchanged:
+                    return (
+                        (entry.relpath, True, db_sha256, db_size)
+                        + path_stat
+                        + (
+                            db_fingerprint,
+                            db_pending,
+                            db_algo,
+                        )
+                    )
 
-            return lazy_calculating_path_status
+                if fingerprint_block and db_fingerprint:
+                    fingerprint = FolderStatus._cal_fingerprint(
+                        entry.path, size, fingerprint_block
+                    )
+                    if fingerprint == db_fingerprint:
+                        # 抽样内容一致, 推迟计算sha256(抽样覆盖了整个文件时无需校验)
+                        pending = bool(db_pending) or size > 3 * fingerprint_block
+                        return (
+                            (entry.relpath, True, db_sha256, db_size)
+                            + path_stat
+                            + (
+                                fingerprint,
+                                pending,
+                                db_algo,
+                            )
+                        )
+
+        sha256 = FolderStatus._cal_hash(entry.path, algorithm)
+        fingerprint = (
+            FolderStatus._cal_fingerprint(entry.path, size, fingerprint_block)
+            if fingerprint_block
+            else None
+        )
+        return (
+            (entry.relpath, True, sha256, size)
+            + path_stat
+            + (
+                fingerprint,
+                False,
+                algorithm,
+            )
+        )
 
     @property
     def _database(self) -> _lt.DbOperator:
         if "db" not in self.__cache:
             if self.__dbpath.is_file():
-                db = _lt.DbOperator(self.__dbpath)
+                db = _lt.DbOperator(self.__dbpath, profile=self.db_profile)
+                self.__upgrade_database(db)
             else:
                 db = self.__create_database()
 
             self.__cache["db"] = db
         return self.__cache["db"]
 
+    def close(self):
+        """关闭数据库连接"""
+        if (db := self.__cache.pop("db", None)) is not None:
+            db.close()
+
+    def __upgrade_database(self, db: _lt.DbOperator):
+        """
+        将FSDB 1.1.0的数据库(没有SCHEMA_VERSION表)迁移到当前版本(见_migrate_1_1_0)。
+        迁移和版本记录在同一个事务中进行, 中断后下次打开时重新迁移
+        """
+        if "SCHEMA_VERSION" in db.table_list:
+            return
+
+        _loguru.logger.info(
+            f"升级数据库'{self.__dbpath}'(FSDB 1.1.0 -> {FSDB_VERSION})"
+        )
+        with db.transaction():
+            self._migrate_1_1_0(db)
+            db.insert_many(
+                "SCHEMA_VERSION",
+                ("VERSION", "TIME"),
+                [("1.1.0", None), (FSDB_VERSION, _time.time())],
+                commit=False,
+            )
+
+    @classmethod
+    def _migrate_1_1_0(cls, db: _lt.DbOperator):
+        """
+        将FSDB 1.1.0的数据库迁移到当前版本:
+        - STATUS表改为以PATH为主键的WITHOUT ROWID表, 增加文件元数据、分层检测和哈希算法列
+          (已有文件的哈希均为sha256, 文件元数据在下一次扫描时补全)
+        - VARIANCE表增加哈希算法列和OLDPATH列(移动)
+        - 增加META、CHECKPOINT、SCAN_PROGRESS、SCHEMA_VERSION表和索引
+        不使用DbOperator.create_table(会自动commit), 以保证整个迁移在同一个事务中
+        """
+
+        def create_table(table: str, define: list[tuple[str]], options: str = ""):
+            columns = ", ".join(" ".join(i) for i in define)
+            db.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}) {options};")
+
+        create_table("STATUS_NEW", cls._status_table_define, cls._status_table_options)
+        # 1.1.0的STATUS表没有主键, 重复的PATH保留最后插入的一行
+        db.execute(
+            "INSERT OR REPLACE INTO STATUS_NEW (PATH, ISFILE, SHA256, SIZE, ALGO)"
+            " SELECT PATH, ISFILE, SHA256, SIZE, CASE WHEN ISFILE THEN 'sha256' END"
+            " FROM STATUS ORDER BY rowid;"
+        )
+        db.execute("DROP TABLE STATUS;")
+        db.execute("ALTER TABLE STATUS_NEW RENAME TO STATUS;")
+        db.execute("ALTER TABLE VARIANCE ADD COLUMN ALGO TEXT;")
+        db.execute("UPDATE VARIANCE SET ALGO = 'sha256' WHERE ISFILE;")
+        db.execute("ALTER TABLE VARIANCE ADD COLUMN OLDPATH TEXT;")
+        for name, table, define in cls._index_define:
+            db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {define};")
+
+        create_table("META", cls._meta_table_define)
+        db.execute(
+            "INSERT OR REPLACE INTO META (KEY, VALUE) VALUES (?, ?);",
+            ("path_layout", "plain"),
+        )
+        create_table("CHECKPOINT", cls._checkpoint_table_define)
+        db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS CHECKPOINT_TIME ON CHECKPOINT (TIME, CHUNK);"
+        )
+        create_table(
+            "SCAN_PROGRESS", cls._status_table_define, cls._status_table_options
+        )
+        create_table("SCHEMA_VERSION", cls._schema_version_table_define)
+
     @property
-    def iterdirs(self) -> _typing.Generator[_pathlib.Path, None, None]:
+    def iterdirs(self) -> _typing.Generator["ScanEntry", None, None]:
         """
-        遍历文件夹中的文件或文件夹的生成器(生成绝对路径)
+        遍历文件夹中的文件或文件夹的生成器
+        按相对路径排序流式生成, 顺序与数据库中按PATH排序的结果一致
 
         Yields
         ---
-        item : pathlib.Path
-            文件夹内的文件/文件夹的绝对路径
+        item : ScanEntry
+            文件夹内的文件/文件夹(path-like, 携带遍历时得到的类型和stat)
+        """
+        for _, entry in self.__walk_join(_Peekable(())):
+            yield entry
+
+    @property
+    def __ignored_paths(self) -> set[str]:
+        """扫描时跳过的路径(数据库的日志文件, 更新时会不断变动)"""
+        key = "ignored_paths"
+        if key not in self.__cache:
+            dbpath = str(self.__dbpath)
+            self.__cache[key] = {
+                dbpath + suffix for suffix in ("-journal", "-wal", "-shm")
+            }
+        return self.__cache[key]
+
+    def __list_sorted(self, reldir: str) -> list[tuple[str, _os.DirEntry | None]]:
+        """
+        列出文件夹的项目(基于os.scandir), 返回按遍历顺序排序的(键, DirEntry)。
+
+        子文件夹"name"自身的键为"name", 其内部项目的键为"name/"(DirEntry为None),
+        例如"a" < "a.txt" < "a/" < "a0", 依次遍历即与sorted的顺序一致("a" < "a.txt" < "a/x" < "a0")。
+        与os.walk一致, 不进入指向文件夹的符号链接, 无法读取的文件夹视为空。
+
+        Parameters
+        ---
+        reldir : str
+            文件夹的相对路径(非空时以路径分隔符结尾)
+        """
+        try:
+            with _os.scandir(_os.path.join(str(self.__root), reldir)) as it:
+                entries = list(it)
+        except OSError:
+            return []
+
+        ignored_paths = self.__ignored_paths
+        keys: list[tuple[str, _os.DirEntry | None]] = []
+        for entry in entries:
+            if entry.path in ignored_paths:
+                continue
+            keys.append((entry.name, entry))
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            if is_dir:
+                keys.append((entry.name + _os.sep, None))
+        keys.sort(key=_operator.itemgetter(0))
+        return keys
+
+    @staticmethod
+    def __scan_entry(
+        relpath: str, dir_entry: _os.DirEntry, stat_dirs: bool
+    ) -> "ScanEntry | None":
+        """
+        由DirEntry生成ScanEntry(文件类型来自DirEntry缓存的d_type, 每个文件最多一次stat)
+
+        Parameters
+        ---
+        stat_dirs : bool
+            是否对文件夹进行stat(文件夹剪枝需要文件夹的mtime)
+
+        Returns
+        ---
+        遍历期间被删除则返回None
+        """
+        try:
+            if dir_entry.is_file():
+                return ScanEntry(relpath, dir_entry.path, True, dir_entry.stat())
+            if stat_dirs and dir_entry.is_dir(follow_symlinks=False):
+                stat = dir_entry.stat(follow_symlinks=False)
+                return ScanEntry(relpath, dir_entry.path, False, stat)
+            return ScanEntry(relpath, dir_entry.path, False, None)
+        except OSError:
+            return None
+
+    def __scan_dir(
+        self, reldir: str, stat_dirs: bool
+    ) -> list[tuple[str, "ScanEntry | None"]]:
+        """
+        列出文件夹的项目并统计(见__list_sorted、__scan_entry), 返回按遍历顺序排序的(键, ScanEntry)。
+        子文件夹内部项目的键(以路径分隔符结尾)、遍历期间被删除的项目对应None
+        """
+        return [
+            (
+                key,
+                (
+                    None
+                    if dir_entry is None
+                    else self.__scan_entry(reldir + key, dir_entry, stat_dirs)
+                ),
+            )
+            for key, dir_entry in self.__list_sorted(reldir)
+        ]
+
+    @staticmethod
+    def __drain_deleted(
+        old: "_Peekable", relpath: str
+    ) -> _typing.Generator[tuple[_t_path_sta, None], None, None]:
+        """生成旧状态中路径排在relpath之前的项目(即已被删除的项目)"""
+        while (path_sta_old := old.peek()) is not None and path_sta_old[0] < relpath:
+            yield next(old), None
+
+    def __walk_join(
+        self,
+        old: "_Peekable",
+        reldir: str = "",
+        stat_dirs: bool = False,
+        prune: bool = False,
+        lister: "_AsyncDirLister | None" = None,
+    ) -> _typing.Generator[tuple[_t_path_sta | None, "ScanEntry | None"], None, None]:
+        """
+        按相对路径的字符串顺序深度优先遍历文件夹, 同时与按PATH排序的旧状态归并,
+        生成(旧路径状态, 遍历得到的项目), 缺失的一侧为None。
+        只需在内存中保留当前路径上各层文件夹的项目列表。
+
+        Parameters
+        ---
+        old : _Peekable
+            按PATH排序的旧状态
+        reldir : str, default = ""
+            开始遍历的文件夹的相对路径(非空时以路径分隔符结尾)
+        stat_dirs : bool, default = False
+            是否对文件夹进行stat
+        prune : bool, default = False
+            是否剪枝: mtime与旧状态一致的文件夹不再列出内容, 由__reuse_subtree沿用旧状态
+        lister : _AsyncDirLister | None, default = None
+            并发预读文件夹的列出器(scan_backend == "asyncio"), 为None则逐个列出
+        """
+        if lister is None:
+            scan_dir = self.__scan_dir
+        else:
+            # 剪枝时不预读子文件夹(否则会列出被剪枝的文件夹)
+            scan_dir = _functools.partial(lister.scan, readahead=not prune)
+        unchanged_dirs: set[str] = set()
+        for key, entry in scan_dir(reldir, stat_dirs):
+            relpath = reldir + key
+            yield from self.__drain_deleted(old, relpath)
+
+            if key.endswith(_os.sep):
+                # 子文件夹的内部项目
+                if relpath in unchanged_dirs:
+                    yield from self.__reuse_subtree(old, relpath, lister)
+                else:
+                    yield from self.__walk_join(old, relpath, stat_dirs, prune, lister)
+                continue
+
+            if entry is None:
+                # 遍历期间被删除
+                continue
+            path_sta_old = None
+            if (peek := old.peek()) is not None and peek[0] == relpath:
+                path_sta_old = next(old)
+            if (
+                prune
+                and path_sta_old is not None
+                and entry.stat is not None
+                and not entry.is_file
+                and path_sta_old[4] == entry.stat.st_mtime_ns
+            ):
+                unchanged_dirs.add(relpath + _os.sep)
+            yield path_sta_old, entry
+
+        # 文件夹内剩余的旧状态都已被删除
+        while (path_sta_old := old.peek()) is not None and path_sta_old[0].startswith(
+            reldir
+        ):
+            yield next(old), None
+
+    def __reuse_subtree(
+        self,
+        old: "_Peekable",
+        subdir: str,
+        lister: "_AsyncDirLister | None" = None,
+    ) -> _typing.Generator[tuple[_t_path_sta | None, "ScanEntry | None"], None, None]:
+        """
+        沿用被剪枝的子树(文件夹的mtime未变, 其直接子项没有增删)在旧状态中的数据。
+        子树内的文件不进行stat; 子树内的文件夹逐个stat, mtime变化的文件夹重新遍历。
+
+        Parameters
+        ---
+        old : _Peekable
+            按PATH排序的旧状态
+        subdir : str
+            被剪枝的文件夹的相对路径(以路径分隔符结尾)
+        lister : _AsyncDirLister | None, default = None
+            并发预读文件夹的列出器(见__walk_join)
+        """
+        root = str(self.__root)
+        # 需要重新遍历(True)或已被删除(False)的文件夹, 其内部项目按"文件夹/"的位置处理,
+        # 排在其后、以更小的字符开头的同级项目(比如"d-old"、"d.txt"排在"d/"之前)先照常沿用
+        pending: list[tuple[str, bool]] = []
+        while True:
+            path_sta_old = old.peek()
+            if path_sta_old is not None and not path_sta_old[0].startswith(subdir):
+                path_sta_old = None
+            if pending and (path_sta_old is None or path_sta_old[0] >= pending[0][0]):
+                reldir, changed = _heapq.heappop(pending)
+                if changed:
+                    yield from self.__walk_join(old, reldir, True, True, lister)
+                else:
+                    while (peek := old.peek()) is not None and peek[0].startswith(
+                        reldir
+                    ):
+                        yield next(old), None
+                continue
+            if path_sta_old is None:
+                break
+
+            next(old)
+            relpath, isfile, *_ = path_sta_old
+            path = _os.path.join(root, relpath)
+            if isfile or path_sta_old[4] is None:
+                # 文件, 或未记录元数据的项目(比如指向文件夹的符号链接)
+                yield path_sta_old, ScanEntry(relpath, path, bool(isfile), None)
+                continue
+
+            try:
+                stat = _os.stat(path, follow_symlinks=False)
+            except OSError:
+                # 遍历期间被删除
+                yield path_sta_old, None
+                _heapq.heappush(pending, (relpath + _os.sep, False))
+                continue
+            yield path_sta_old, ScanEntry(relpath, path, False, stat)
+            if stat.st_mtime_ns != path_sta_old[4]:
+                _heapq.heappush(pending, (relpath + _os.sep, True))
+
+    def __process_units(
+        self,
+        old: "_Peekable",
+        progress: "_Peekable",
+        reldir: str = "",
+        prune: bool = False,
+    ) -> _typing.Generator[list, None, None]:
+        """
+        按路径顺序生成scan_backend == "process"时完整扫描的工作单元(见_scan_work_unit)。
+        父进程只列出文件夹(不stat文件), 工作单元的元素为:
+        - (旧路径状态, 项目, 可沿用的路径状态): 父进程列出的项目, 文件的项目为相对路径(由子进程stat),
+          已被删除的项目为None
+        - _SubtreeUnit: 子文件夹的整个子树, 由子进程列出、stat并与旧状态归并
+        旧状态多于work_unit_size项或没有旧状态(无法预估大小)的子文件夹由父进程继续展开;
+        被剪枝的子树由父进程沿用旧状态(见__reuse_subtree, 其中的文件不进行stat)。
+
+        Parameters
+        ---
+        old : _Peekable
+            按PATH排序的旧状态
+        progress : _Peekable
+            按PATH排序的SCAN_PROGRESS表
+        reldir : str, default = ""
+            开始遍历的文件夹的相对路径(非空时以路径分隔符结尾)
+        prune : bool, default = False
+            是否进行文件夹剪枝
+        """
+        stat_dirs = self.prune_unchanged_dirs
+        unit_size = self.work_unit_size
+        unchanged_dirs: set[str] = set()
+        unit: list = []
+        weight = 0
+
+        def take(stream: _Peekable, prefix: str, limit: int | None = None) -> list:
+            rows = []
+            while (limit is None or len(rows) <= limit) and (
+                (peek := stream.peek()) is not None and peek[0].startswith(prefix)
+            ):
+                rows.append(next(stream))
+            return rows
+
+        for key, dir_entry in self.__list_sorted(reldir):
+            relpath = reldir + key
+            for path_sta_old, _ in self.__drain_deleted(old, relpath):
+                unit.append((path_sta_old, None, None))
+                weight += 1
+            while (peek := progress.peek()) is not None and peek[0] < relpath:
+                next(progress)
+
+            if dir_entry is None:
+                # 子文件夹的内部项目
+                if relpath in unchanged_dirs:
+                    items = self.__attach_progress(
+                        self.__reuse_subtree(old, relpath), progress
+                    )
+                    for item in items:
+                        unit.append(item)
+                        if len(unit) >= unit_size:
+                            yield unit
+                            unit = []
+                    weight = len(unit)
+                    continue
+                rows = take(old, relpath, unit_size)
+                if not rows or len(rows) > unit_size:
+                    old.push(rows)
+                    if unit:
+                        yield unit
+                        unit, weight = [], 0
+                    yield from self.__process_units(old, progress, relpath, prune)
+                    continue
+                unit.append(_SubtreeUnit(relpath, rows, take(progress, relpath)))
+                weight += len(rows)
+            else:
+                path_sta_old = None
+                if (peek := old.peek()) is not None and peek[0] == relpath:
+                    path_sta_old = next(old)
+                path_sta_reuse = path_sta_old
+                if (peek := progress.peek()) is not None and peek[0] == relpath:
+                    path_sta_reuse = next(progress)
+                try:
+                    is_file = dir_entry.is_file()
+                except OSError:
+                    is_file = False
+                if is_file:
+                    entry = relpath
+                elif (
+                    entry := self.__scan_entry(relpath, dir_entry, stat_dirs)
+                ) is None:
+                    # 遍历期间被删除
+                    entry = None
+                elif (
+                    prune
+                    and path_sta_old is not None
+                    and entry.stat is not None
+                    and path_sta_old[4] == entry.stat.st_mtime_ns
+                ):
+                    unchanged_dirs.add(relpath + _os.sep)
+                if entry is not None or path_sta_old is not None:
+                    unit.append((path_sta_old, entry, path_sta_reuse))
+                    weight += 1
+            if weight >= unit_size:
+                yield unit
+                unit, weight = [], 0
+
+        # 文件夹内剩余的旧状态都已被删除
+        unit.extend((path_sta_old, None, None) for path_sta_old in take(old, reldir))
+        if unit:
+            yield unit
+
+    def _scan_subtree(
+        self, unit: "_SubtreeUnit", stat_dirs: bool = False, prune: bool = False
+    ) -> _typing.Generator[
+        tuple[_t_path_sta | None, "ScanEntry | None", _t_path_sta | None], None, None
+    ]:
+        """
+        遍历一个子树并与其旧状态归并(scan_backend == "process"时在子进程中运行, 见__process_units),
+        生成(旧路径状态, 遍历得到的项目, 可沿用的路径状态)
+        """
+        pairs = self.__walk_join(_Peekable(unit.old), unit.reldir, stat_dirs, prune)
+        return self.__attach_progress(pairs, _Peekable(unit.progress))
+
+    def __walk_paths(
+        self, relpaths: _typing.Iterable[str]
+    ) -> _typing.Generator[tuple[_t_path_sta | None, "ScanEntry | None"], None, None]:
+        """
+        只遍历指定的路径, 按路径顺序生成(旧路径状态, 遍历得到的项目), 缺失的一侧为None。
+        路径为文件夹时遍历其整个子树, 路径不存在时其(原有的)子树也视为被删除。
+
+        Parameters
+        ---
+        relpaths : Iterable[str]
+            相对路径
         """
-        for root, dirs, files in _os.walk(self.__root):
-            root = _pathlib.Path(root)
-            for name in files + dirs:
-                item_dir: _pathlib.Path = root / name
-                item_dir = item_dir.absolute()
-                yield item_dir
+        db = self._database
+        root = str(self.__root)
+        sep = _os.sep
+        stat_dirs = self.prune_unchanged_dirs
+        ignored_paths = self.__ignored_paths
+        subtree = None
+        # 按路径的各级名称排序, 使子路径紧随其上级路径("a" < "a/b" < "a.txt")
+        for relpath in sorted(set(relpaths), key=lambda i: i.split(sep)):
+            if subtree is not None and relpath.startswith(subtree):
+                # 已随上级路径处理
+                continue
+            subtree = relpath + sep
+            path = _os.path.join(root, relpath)
+            if path in ignored_paths:
+                continue
+            # 路径自身及其子树的旧状态("a" < "a/..." < "a0")
+            old_cursor = db.select(
+                "STATUS",
+                self._status_column_name,
+                "WHERE PATH = ? OR (PATH >= ? AND PATH < ?) ORDER BY PATH",
+                (relpath, relpath + sep, relpath + chr(ord(sep) + 1)),
+            )
+            try:
+                old = _Peekable(old_cursor)
+                path_sta_old = None
+                if (peek := old.peek()) is not None and peek[0] == relpath:
+                    path_sta_old = next(old)
+
+                # 与__list_sorted、__scan_entry对文件类型的判断一致
+                entry, is_dir = None, False
+                try:
+                    if _os.path.isfile(path):
+                        entry = ScanEntry(relpath, path, True, _os.stat(path))
+                    elif _os.path.lexists(path):
+                        is_dir = _os.path.isdir(path) and not _os.path.islink(path)
+                        stat = (
+                            _os.stat(path, follow_symlinks=False)
+                            if stat_dirs and is_dir
+                            else None
+                        )
+                        entry = ScanEntry(relpath, path, False, stat)
+                except OSError:
+                    entry, is_dir = None, False
+
+                if path_sta_old is not None or entry is not None:
+                    yield path_sta_old, entry
+                if is_dir:
+                    yield from self.__walk_join(old, subtree, stat_dirs)
+                for path_sta_old in old:
+                    # 原来的文件夹已不存在(或不再是文件夹)
+                    yield path_sta_old, None
+            finally:
+                old_cursor.close()
 
     @property
     def change_overview(self) -> str:
         """以markdown语法, 返回文件夹内文件和文件夹的变动"""
         _loguru.logger.info("扫描文件夹中被更改的项目")
-        _loguru.logger.info("    载入数据库内旧的文件夹状态数据")
-        old_folder_status: self._t_list_sta = self._database.select("STATUS")
-        _loguru.logger.info("    扫描文件夹变动")
-        variance = self.__gene_variance(
-            old_folder_status, self.__scan_folder_status(), 0
+        changes = self._diff_pairs(self.__iter_status_pairs(self.__prune_due))
+        return self._render_overview(changes, f"根目录: `{self.__root}`\n")
+
+    def change_overview_between(
+        self, start_time: float, end_time: float | None = None
+    ) -> str:
+        """
+        以markdown语法, 返回文件夹在两个时间点之间的变动(根据数据库的历史记录, 不扫描文件夹)
+
+        Parameters
+        ---
+        start_time : float
+            较早的时间点
+        end_time : float | None, default = None
+            较晚的时间点, 为None则为最后一次更新(STATUS表)
+        """
+        old = self.snapshot_at(start_time)
+        if end_time is None:
+            new = self._database.select(
+                "STATUS", self._status_column_name, "ORDER BY PATH"
+            )
+        else:
+            new = self.snapshot_at(end_time)
+
+        def strftime(time_: float | None) -> str:
+            if time_ is None:
+                return "最后一次更新"
+            return _time.strftime("%Y-%m-%d %H:%M:%S", _time.localtime(time_))
+
+        header = (
+            f"根目录: `{self.__root}`\n\n"
+            f"时间: {strftime(start_time)} -> {strftime(end_time)}\n"
         )
+        return self._render_overview(self.diff_status(old, new), header)
+
+    @staticmethod
+    def _render_overview(
+        changes: _typing.Iterable["FolderStatus._t_change"], header: str
+    ) -> str:
+        """
+        以markdown语法渲染变化(见diff_status)
 
+        Parameters
+        ---
+        changes : Iterable[tuple]
+            变化序列(kind, 旧状态, 新状态)
+        header : str
+            "变更总览"标题下的说明文字
+        """
         # 装为dict
+        change_flag = {
+            "added": "- [x] ",
+            "deleted": "- [ ] ",
+            "modified": "* ",
+            "moved": "- [>] ",
+        }
         sta_dict = {}
-        for path, is_file, _, _, _, change in variance:
+        moves = []
+        for kind, path_sta_old, path_sta_new in FolderStatus._pair_moves(changes):
+            if kind == "moved":
+                moves.append(f"- `{path_sta_old[0]}` -> `{path_sta_new[0]}`")
+            path, is_file, *_ = path_sta_old if path_sta_new is None else path_sta_new
             path = _pathlib.Path(path)
             insert_target = sta_dict
 
@@ -339,12 +1181,7 @@ class FolderStatus:
                     insert_target.setdefault(p, {})
 
                 if i == last_idx:
-                    flag = "- [x] " if change else "- [ ] "
-                    flag = (
-                        flag
-                        if {insert_target[p].get(0), flag} != {"- [x] ", "- [ ]"}
-                        else "* "
-                    )
+                    flag = change_flag[kind]
                     insert_target[p][0] = f"{flag}{'`f`' if is_file else '`d`'}"
 
                 insert_target = insert_target[p]
@@ -360,11 +1197,11 @@ class FolderStatus:
 * 变动
 - [x] 新增
 - [ ] 删去
+- [>] 移入(原路径见"移动")
 
 # 变更总览
 
-根目录: `{self.__root}`
-"""
+{header}"""
         ]
         pathiter = None
         stack = [iter(sta_dict.items())]
@@ -387,6 +1224,9 @@ class FolderStatus:
             else:
                 pathiter = None
 
+        if moves:
+            msg.append("\n# 移动\n")
+            msg.extend(moves)
         return "\n".join(msg)
 
     @property
@@ -400,153 +1240,1368 @@ class FolderStatus:
             FSDB_VERSION,
         )
 
-    def __scan_folder_status(self, force_update=False) -> _t_list_sta:
-        key = "folder_status"
-        if force_update or key not in self.__cache:
-            path_seq = _tqdm.tqdm(
-                list(self.iterdirs), desc=f"扫描文件夹'{self.__root.name}'内项目", mininterval=1
-            )
-            sta = list(map(self.__gene_path_status, path_seq))
-            sta.sort()
-            self.__cache[key] = sta
-        return self.__cache[key]
+    @property
+    def _max_workers(self) -> int:
+        """扫描时实际使用的并发数"""
+        return self.jobs if self.jobs >= 1 else (_os.cpu_count() or 1)
 
-    def __create_database(self) -> _lt.DbOperator:
-        """创建数据库"""
-        dbpath = self.__dbpath
-        _loguru.logger.info("创建数据库")
-        db = _lt.DbOperator(dbpath)
-        _loguru.logger.info("    初始化数据库表")
-        # 创建STATUS表, 记录当前文件夹状态
-        # PATH ISFILE SHA256 SIZE
-        db.create_table(
-            "STATUS",
-            [
-                ("PATH", "TEXT", "NOT NULL"),
-                ("ISFILE", "TINYINT", "NOT NULL"),
-                ("SHA256", "CHARACTER(64)"),
-                ("SIZE", "BIGINT"),
-            ],
-        )
-        # 创建INFO表, 每次更新数据库的信息, 最新的一次对应STATUS表的信息
-        # TIME ROOT MAC COMMENT VERSION
-        db.create_table(
-            "INFO",
-            [
-                ("TIME", "DOUBLE", "NOT NULL"),
-                ("ROOT", "TEXT"),
-                ("MAC", "TEXT"),
-                ("COMMENT", "TEXT"),
-                ("VERSION", "TEXT"),
-            ],
-        )
-        # 创建VARIANCE表, 记录每次更新, 文件夹内的文件增减情况
-        # PATH ISFILE SHA256 SIZE TIME STATUS
-        # TIME与INFO最新项一致
-        # STATUS是布尔值, True代表新增的文件/文件夹, False代表删去的文件/文件夹
-        db.create_table(
-            "VARIANCE",
-            [
-                ("PATH", "TEXT", "NOT NULL"),
-                ("ISFILE", "TINYINT", "NOT NULL"),
-                ("SHA256", "CHARACTER(64)"),
-                ("SIZE", "BIGINT"),
-                ("TIME", "DOUBLE", "NOT NULL"),
-                ("CHANGE", "TINYINT", "NOT NULL"),
-            ],
-        )
-        # 载入基本数据
-        _loguru.logger.info("    初始化数据库基础数据")
-        db.try_exe("DELETE FROM STATUS;")
-        db.insert_many("STATUS", self._status_column_name, self.__scan_folder_status())
-        db.insert_many(
-            "INFO",
-            self._info_column_name,
-            [self.__gene_update_info],
-        )
-        _loguru.logger.info("    完成")
-        return db
+    @property
+    def __last_update_time(self) -> float:
+        """数据库最后一次更新的时间"""
+        (last_update_time,) = self._database.select("INFO", "MAX(TIME)").fetchone()
+        return last_update_time or 0
 
-    def update_database(self) -> _lt.DbOperator:
-        """根据文件夹当前状态, 更新数据库"""
-        db = self._database
-        info = self.__gene_update_info
-        update_time = info[0]
+    @property
+    def __prune_due(self) -> bool:
+        """本次扫描是否进行文件夹剪枝(距离上次完整遍历不超过full_walk_interval秒)"""
+        if not (self.prune_unchanged_dirs and self.fast_scan):
+            return False
+        row = self._database.select(
+            "META", "VALUE", "WHERE KEY = ?", ("last_full_walk",)
+        ).fetchone()
+        return row is not None and _time.time() - row[0] < self.full_walk_interval
 
-        _loguru.logger.info("更新数据库")
-        _loguru.logger.info("    载入数据库内旧的文件夹状态数据")
-        old_folder_status: self._t_list_sta = db.select("STATUS")
-        _loguru.logger.info("    扫描文件夹变动")
-        variance = self.__gene_variance(
-            old_folder_status, self.__scan_folder_status(), update_time
-        )
+    @staticmethod
+    def __attach_progress(
+        pairs: _typing.Iterable[tuple[_t_path_sta | None, "ScanEntry | None"]],
+        progress: "_Peekable",
+    ) -> _typing.Generator[
+        tuple[_t_path_sta | None, "ScanEntry | None", _t_path_sta | None], None, None
+    ]:
+        """
+        为按路径排序的(旧路径状态, 项目)附上可沿用的路径状态:
+        上一次被中断的扫描已计算过哈希的项目沿用SCAN_PROGRESS表中的记录, 其余沿用旧路径状态
 
-        # 更新表
-        _loguru.logger.info("    更新VARIANCE表")
-        db.insert_many("VARIANCE", self._variance_column_name, variance)
-        _loguru.logger.info("    更新STATUS表")
-        db.try_exe("DELETE FROM STATUS;")
-        db.insert_many("STATUS", self._status_column_name, self.__scan_folder_status())
-        _loguru.logger.info("    更新INFO表")
-        db.insert_many(
-            "INFO",
-            self._info_column_name,
-            [info],
-        )
+        Parameters
+        ---
+        pairs : Iterable[tuple]
+            按路径排序的(旧路径状态, 项目)
+        progress : _Peekable
+            按PATH排序的SCAN_PROGRESS表
+        """
+        for path_sta_old, entry in pairs:
+            path_sta_reuse = path_sta_old
+            if entry is not None and entry.stat is not None:
+                while (peek := progress.peek()) is not None and peek[0] < entry.relpath:
+                    next(progress)
+                if peek is not None and peek[0] == entry.relpath:
+                    path_sta_reuse = next(progress)
+            yield path_sta_old, entry, path_sta_reuse
+
+    def __iter_status_pairs(
+        self, prune: bool = False, relpaths: _typing.Iterable[str] | None = None
+    ) -> _typing.Generator[tuple[_t_path_sta | None, _t_path_sta | None], None, None]:
+        """
+        流式扫描文件夹, 按路径顺序生成(旧路径状态, 新路径状态), 路径不存在的一侧为None。
+
+        遍历与数据库中按PATH排序的STATUS表归并, 再分批统计路径状态,
+        因此内存占用只与批次大小有关, 与文件夹大小无关。
+        完整扫描时同时与SCAN_PROGRESS表归并, 沿用上一次被中断的扫描已计算的哈希。
+        - scan_backend == "thread": 逐项在线程池中统计(hashlib计算时会释放GIL)
+        - scan_backend == "process": 子树整体作为工作单元, 在子进程中列出、stat、与旧状态归并并统计,
+          父进程只列出旧状态多于work_unit_size项的文件夹(见__process_units)
+        - scan_backend == "asyncio": 与"thread"相同, 但以asyncio并发预读文件夹(见_AsyncDirLister)
+        进度条以字节计。
+
+        Parameters
+        ---
+        prune : bool, default = False
+            是否进行文件夹剪枝
+        relpaths : Iterable[str] | None, default = None
+            只扫描这些路径(及其子树, 见__walk_paths), 为None则扫描整个文件夹
+        """
+        db = self._database
+        fast_scan = self.fast_scan
+        last_update_time = self.__last_update_time if fast_scan else 0
+        max_workers = self._max_workers
+
+        lister = None
+        match self.scan_backend:
+            case "thread":
+                executor_type = _futures.ThreadPoolExecutor
+                unit_size = 1
+            case "asyncio":
+                executor_type = _futures.ThreadPoolExecutor
+                unit_size = 1
+                if relpaths is None:
+                    lister = _AsyncDirLister(
+                        self.__list_sorted,
+                        self.__scan_entry,
+                        self.async_concurrency,
+                        self.async_readahead,
+                    )
+            case "process":
+                executor_type = _futures.ProcessPoolExecutor
+                unit_size = self.work_unit_size
+            case _:
+                raise ValueError(f"Unknown scan backend ({self.scan_backend}).")
+        if self.executor is not None:
+            executor = _contextlib.nullcontext(self.executor)
+        else:
+            executor = executor_type(max_workers)
+
+        cursors = []
+        if relpaths is None:
+            old_cursor = db.select("STATUS", self._status_column_name, "ORDER BY PATH")
+            progress_cursor = db.select(
+                "SCAN_PROGRESS", self._status_column_name, "ORDER BY PATH"
+            )
+            cursors += [old_cursor, progress_cursor]
+            if self.scan_backend == "process":
+                pairs = self.__process_units(
+                    _Peekable(old_cursor), _Peekable(progress_cursor), prune=prune
+                )
+            else:
+                pairs = self.__walk_join(
+                    _Peekable(old_cursor),
+                    stat_dirs=self.prune_unchanged_dirs,
+                    prune=prune,
+                    lister=lister,
+                )
+                pairs = self.__attach_progress(pairs, _Peekable(progress_cursor))
+        else:
+            pairs = self.__walk_paths(relpaths)
+            pairs = (
+                (path_sta_old, entry, path_sta_old) for path_sta_old, entry in pairs
+            )
+        if self.scan_backend == "process" and relpaths is None:
+            units = pairs
+        else:
+            units = _batched(pairs, unit_size)
+        scan_unit = _functools.partial(
+            _scan_work_unit,
+            root=str(self.__root),
+            dbpath=str(self.__dbpath),
+            stat_dirs=self.prune_unchanged_dirs,
+            prune=prune,
+            fast_scan=fast_scan,
+            last_update_time=last_update_time,
+            fingerprint_block=(
+                self.fingerprint_block_size if self.tiered_verify else None
+            ),
+            algorithm=self.hash_algorithm,
+        )
+
+        with (
+            _tqdm.tqdm(
+                desc=f"扫描文件夹'{self.__root.name}'内项目",
+                unit="B",
+                unit_scale=True,
+                unit_divisor=1024,
+                mininterval=1,
+            ) as pbar,
+            executor as executor,
+        ):
+            if max_workers > 1 or self.executor is not None:
+                results = _ordered_imap(executor, scan_unit, units, max_workers * 2)
+            else:
+                results = ((unit, scan_unit(unit)) for unit in units)
+
+            try:
+                for _, unit_pairs in results:
+                    for path_sta_old, path_sta_new in unit_pairs:
+                        if path_sta_new is not None:
+                            pbar.update(path_sta_new[3] or 0)
+                        yield path_sta_old, path_sta_new
+            finally:
+                pairs.close()
+                for cursor in cursors:
+                    cursor.close()
+                if lister is not None:
+                    lister.close()
+
+    def __write_status(
+        self,
+        db: _lt.DbOperator,
+        info: tuple,
+        record_variance: bool,
+        relpaths: _typing.Iterable[str] | None = None,
+    ):
+        """
+        流式扫描文件夹, 只将变化写入数据库(更新成本与变化量相关, 与文件夹大小无关)。
+
+        扫描时读取着STATUS表, 因此先把变化分批暂存到临时表,
+        扫描结束后在同一事务中: 写入VARIANCE表, 删去STATUS表中不存在的路径,
+        UPSERT新增或状态(包括文件元数据)变化的路径, 写入INFO表。
+        暂存的同时, 将计算了哈希的文件写入SCAN_PROGRESS表并提交(至少每scan_progress_interval秒一次),
+        扫描被中断后, 下一次完整扫描可以沿用; 完整扫描结束后清空SCAN_PROGRESS表。
+
+        Parameters
+        ---
+        db : litetools.DbOperator
+            数据库
+        info : tuple
+            本次更新的INFO
+        record_variance : bool
+            是否记录VARIANCE
+        relpaths : Iterable[str] | None, default = None
+            只扫描这些路径(及其子树), 为None则扫描整个文件夹
+        """
+        update_time = info[0]
+        batch_size = self.work_unit_size
+        prune = relpaths is None and self.__prune_due
+        delta_column_name = self._status_column_name + ("DELETED",)
+        deleted_padding = (None,) * (len(self._status_column_name) - 1) + (True,)
+        delta_batch: list[tuple] = []
+        variance_batch: FolderStatus._t_list_variance = []
+
+        status_columns = ", ".join(self._status_column_name)
+        variance_columns = ", ".join(self._variance_column_name)
+        # 临时表只保留列名和类型(被删去的路径只记录PATH)
+        delta_define = ", ".join(
+            f"{name} {type_}"
+            for name, type_, *_ in self._status_table_define + [("DELETED", "TINYINT")]
+        )
+        variance_define = ", ".join(
+            f"{name} {type_}" for name, type_, *_ in self._variance_table_define
+        )
+        progress_sentence = (
+            f"INSERT OR REPLACE INTO main.SCAN_PROGRESS ({status_columns})"
+            f" VALUES ({', '.join('?' * len(self._status_column_name))});"
+        )
+
+        def flush():
+            """将暂存的变化写入临时表, 计算了哈希的文件写入SCAN_PROGRESS表"""
+            db.insert_many("STATUS_DELTA", delta_column_name, delta_batch, commit=False)
+            db.executemany(
+                progress_sentence,
+                (i[:-1] for i in delta_batch if i[1] and i[2] is not None),
+            )
+            db.insert_many(
+                "VARIANCE_DELTA",
+                self._variance_column_name,
+                variance_batch,
+                commit=False,
+            )
+            delta_batch.clear()
+            variance_batch.clear()
+
+        db.execute("DROP TABLE IF EXISTS temp.STATUS_DELTA;")
+        db.execute("DROP TABLE IF EXISTS temp.VARIANCE_DELTA;")
+        db.execute(f"CREATE TEMP TABLE STATUS_DELTA ({delta_define});")
+        db.execute(f"CREATE TEMP TABLE VARIANCE_DELTA ({variance_define});")
+        progress_due = _time.monotonic() + self.scan_progress_interval
+        for path_sta_old, path_sta_new in self.__iter_status_pairs(prune, relpaths):
+            if path_sta_new is None:
+                delta_batch.append((path_sta_old[0],) + deleted_padding)
+            elif path_sta_old != path_sta_new:
+                delta_batch.append(path_sta_new + (False,))
+            if record_variance and (
+                kind := self._change_kind(path_sta_old, path_sta_new)
+            ):
+                change = (kind, path_sta_old, path_sta_new)
+                variance_batch.extend(self.__gene_variance(change, update_time))
+
+            if (
+                len(delta_batch) >= batch_size
+                or len(variance_batch) >= batch_size
+                or (delta_batch and _time.monotonic() >= progress_due)
+            ):
+                with db.transaction():
+                    flush()
+                progress_due = _time.monotonic() + self.scan_progress_interval
+
+        with db.transaction():
+            flush()
+            if record_variance and self.detect_moves:
+                self.__record_moves(db)
+
+            db.execute(
+                f"INSERT INTO main.VARIANCE ({variance_columns})"
+                f" SELECT {variance_columns} FROM temp.VARIANCE_DELTA ORDER BY rowid;"
+            )
+            db.execute(
+                "DELETE FROM main.STATUS"
+                " WHERE PATH IN (SELECT PATH FROM temp.STATUS_DELTA WHERE DELETED);"
+            )
+            db.execute(
+                f"INSERT OR REPLACE INTO main.STATUS ({status_columns})"
+                f" SELECT {status_columns} FROM temp.STATUS_DELTA WHERE NOT DELETED"
+                " ORDER BY PATH;"
+            )
+            if self.prune_unchanged_dirs and relpaths is None and not prune:
+                # 完整遍历并记录了所有文件夹的mtime
+                db.execute(
+                    "INSERT OR REPLACE INTO META (KEY, VALUE) VALUES (?, ?);",
+                    ("last_full_walk", update_time),
+                )
+            if relpaths is None:
+                db.execute("DELETE FROM main.SCAN_PROGRESS;")
+            db.insert_many("INFO", self._info_column_name, [info], commit=False)
+            db.execute("DROP TABLE temp.STATUS_DELTA;")
+            db.execute("DROP TABLE temp.VARIANCE_DELTA;")
+
+    @staticmethod
+    def __record_moves(db: _lt.DbOperator):
+        """
+        在暂存的VARIANCE_DELTA表中检测移动: 只删去的文件与只新增的文件(不包括原地修改)内容相同,
+        则按路径顺序一一配对, 合并为一条移动记录(CHANGE = 2, OLDPATH为原路径)
+        """
+        candidates = """SELECT rowid AS ID, PATH, SHA256, SIZE, ALGO, ROW_NUMBER() OVER (
+            PARTITION BY SHA256, SIZE, ALGO ORDER BY PATH
+        ) AS RN
+        FROM temp.VARIANCE_DELTA
+        WHERE ISFILE AND SHA256 IS NOT NULL AND CHANGE = {change} AND PATH NOT IN (
+            SELECT PATH FROM temp.VARIANCE_DELTA WHERE CHANGE = {other}
+        )"""
+        # 候选记录先落到带索引的临时表, 避免大批量移动时连接退化为逐行扫描
+        for table, change, other in (("MOVE_DELETED", 0, 1), ("MOVE_ADDED", 1, 0)):
+            db.execute(
+                f"CREATE TEMP TABLE {table} AS"
+                f" {candidates.format(change=change, other=other)};"
+            )
+            db.execute(
+                f"CREATE INDEX temp.{table}_KEY ON {table} (SHA256, SIZE, ALGO, RN);"
+            )
+        db.execute("""CREATE TEMP TABLE MOVE_PAIR (
+                ADDED_ID INTEGER PRIMARY KEY, DELETED_ID INTEGER NOT NULL, OLDPATH TEXT
+            );""")
+        db.execute("CREATE INDEX temp.MOVE_PAIR_DELETED ON MOVE_PAIR (DELETED_ID);")
+        db.execute("""INSERT INTO temp.MOVE_PAIR (ADDED_ID, DELETED_ID, OLDPATH)
+            SELECT A.ID, D.ID, D.PATH
+            FROM temp.MOVE_ADDED AS A JOIN temp.MOVE_DELETED AS D
+            ON D.SHA256 = A.SHA256 AND D.SIZE = A.SIZE
+            AND D.ALGO IS A.ALGO AND D.RN = A.RN;""")
+        db.execute("""UPDATE temp.VARIANCE_DELTA SET CHANGE = 2, OLDPATH = (
+                SELECT OLDPATH FROM temp.MOVE_PAIR WHERE ADDED_ID = VARIANCE_DELTA.rowid
+            ) WHERE rowid IN (SELECT ADDED_ID FROM temp.MOVE_PAIR);""")
+        db.execute(
+            "DELETE FROM temp.VARIANCE_DELTA"
+            " WHERE rowid IN (SELECT DELETED_ID FROM temp.MOVE_PAIR);"
+        )
+        db.execute("DROP TABLE temp.MOVE_DELETED;")
+        db.execute("DROP TABLE temp.MOVE_ADDED;")
+        db.execute("DROP TABLE temp.MOVE_PAIR;")
+
+    @classmethod
+    def _create_tables(
+        cls,
+        db: _lt.DbOperator,
+        layout: _typing.Literal["plain", "normalized"] = "plain",
+    ):
+        """
+        创建当前版本的数据库表
+
+        Parameters
+        ---
+        db : litetools.DbOperator
+            数据库
+        layout : "plain" | "normalized", default = "plain"
+            路径的存储方式, 见FolderStatus.path_layout
+        """
+        match layout:
+            case "plain":
+                # 创建STATUS表, 记录当前文件夹状态
+                # PATH ISFILE SHA256 SIZE ...
+                db.create_table(
+                    "STATUS", cls._status_table_define, cls._status_table_options
+                )
+                # 创建VARIANCE表, 记录每次更新, 文件夹内的文件增减情况
+                # PATH ISFILE SHA256 SIZE TIME STATUS ALGO
+                # TIME与INFO最新项一致
+                # STATUS是布尔值, True代表新增的文件/文件夹, False代表删去的文件/文件夹
+                db.create_table("VARIANCE", cls._variance_table_define)
+                for name, table, define in cls._index_define:
+                    db.execute(
+                        f"CREATE INDEX IF NOT EXISTS {name} ON {table} {define};"
+                    )
+            case "normalized":
+                cls._create_normalized_tables(db)
+            case _:
+                raise ValueError(f"Unknown path layout ({layout}).")
+        # 创建INFO表, 每次更新数据库的信息, 最新的一次对应STATUS表的信息
+        # TIME ROOT MAC COMMENT VERSION
+        db.create_table(
+            "INFO",
+            [
+                ("TIME", "DOUBLE", "NOT NULL"),
+                ("ROOT", "TEXT"),
+                ("MAC", "TEXT"),
+                ("COMMENT", "TEXT"),
+                ("VERSION", "TEXT"),
+            ],
+        )
+        # 创建META表, 记录数据库的其他信息(比如上次完整遍历的时间、路径的存储方式)
+        # KEY VALUE
+        db.create_table("META", cls._meta_table_define)
+        db.execute(
+            "INSERT OR REPLACE INTO META (KEY, VALUE) VALUES (?, ?);",
+            ("path_layout", layout),
+        )
+        # 创建CHECKPOINT表, 记录检查点
+        # TIME CHUNK ROWS DATA
+        db.create_table("CHECKPOINT", cls._checkpoint_table_define)
+        db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS CHECKPOINT_TIME ON CHECKPOINT (TIME, CHUNK);"
+        )
+        # 创建SCAN_PROGRESS表, 记录扫描中已计算哈希的文件(列与STATUS表相同, 扫描完成后清空)
+        # PATH ISFILE SHA256 SIZE ...
+        db.create_table(
+            "SCAN_PROGRESS", cls._status_table_define, cls._status_table_options
+        )
+        # 创建SCHEMA_VERSION表, 记录数据库结构的版本(以及迁移的时间)
+        # VERSION TIME
+        db.create_table("SCHEMA_VERSION", cls._schema_version_table_define)
+        db.insert_many("SCHEMA_VERSION", ("VERSION", "TIME"), [(FSDB_VERSION, None)])
+
+    @classmethod
+    def _create_normalized_tables(cls, db: _lt.DbOperator):
+        """
+        创建"normalized"存储方式的表:
+        - DIRS: ID PARENT PATH, 文件夹(项目所在的文件夹)的路径, 根目录的ID为0、PATH为""
+        - STATUS_DATA, VARIANCE_DATA: 以(DIR, NAME)代替PATH的STATUS表、VARIANCE表
+        - STATUS, VARIANCE: 拼接出PATH的视图, 通过INSTEAD OF触发器支持INSERT(OR REPLACE)和DELETE
+        插入时按PATH排序, 可以保证父文件夹先于子文件夹登记(从而记录PARENT)
+        """
+        sep = _os.sep
+
+        def dirname(path: str) -> str:
+            # rtrim删去最后一个分隔符之后的字符(即文件名), 再删去结尾的分隔符
+            return f"rtrim(rtrim({path}, replace({path}, '{sep}', '')), '{sep}')"
+
+        def basename(path: str) -> str:
+            prefix = f"rtrim({path}, replace({path}, '{sep}', ''))"
+            return f"substr({path}, length({prefix}) + 1)"
+
+        def dir_id(path: str) -> str:
+            return f"(SELECT ID FROM DIRS WHERE PATH = {dirname(path)})"
+
+        def register_dir(path: str) -> str:
+            # 不能用INSERT OR IGNORE: 触发器内的冲突处理会被外层的INSERT OR REPLACE覆盖
+            return (
+                f"INSERT INTO DIRS (PARENT, PATH) SELECT {dir_id(dirname(path))}, {dirname(path)}"
+                f" WHERE NOT EXISTS (SELECT 1 FROM DIRS WHERE PATH = {dirname(path)});"
+            )
+
+        full_path = (
+            f"CASE WHEN D.PATH = '' THEN T.NAME ELSE D.PATH || '{sep}' || T.NAME END"
+        )
+        status_data_columns = ", ".join(cls._status_column_name[1:])
+        variance_data_columns = ", ".join(cls._variance_column_name[1:])
+        status_values = ", ".join(f"NEW.{i}" for i in cls._status_column_name[1:])
+        variance_values = ", ".join(f"NEW.{i}" for i in cls._variance_column_name[1:])
+        status_define = ", ".join(" ".join(i) for i in cls._status_table_define[1:])
+        variance_define = ", ".join(" ".join(i) for i in cls._variance_table_define[1:])
+
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS DIRS"
+            " (ID INTEGER PRIMARY KEY, PARENT INTEGER, PATH TEXT NOT NULL UNIQUE);"
+        )
+        db.execute(
+            "INSERT OR IGNORE INTO DIRS (ID, PARENT, PATH) VALUES (0, NULL, '');"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS STATUS_DATA"
+            f" (DIR INTEGER NOT NULL, NAME TEXT NOT NULL, {status_define},"
+            " PRIMARY KEY (DIR, NAME)) WITHOUT ROWID;"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS VARIANCE_DATA"
+            f" (DIR INTEGER NOT NULL, NAME TEXT NOT NULL, {variance_define});"
+        )
+        db.execute(
+            "CREATE VIEW IF NOT EXISTS STATUS AS"
+            f" SELECT {full_path} AS PATH, {status_data_columns}"
+            " FROM STATUS_DATA AS T JOIN DIRS AS D ON D.ID = T.DIR;"
+        )
+        db.execute(
+            "CREATE VIEW IF NOT EXISTS VARIANCE AS"
+            f" SELECT {full_path} AS PATH, {variance_data_columns}, T.rowid AS rowid"
+            " FROM VARIANCE_DATA AS T JOIN DIRS AS D ON D.ID = T.DIR;"
+        )
+        db.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS STATUS_INSERT INSTEAD OF INSERT ON STATUS
+            BEGIN
+                {register_dir("NEW.PATH")}
+                INSERT OR REPLACE INTO STATUS_DATA (DIR, NAME, {status_data_columns})
+                VALUES ({dir_id("NEW.PATH")}, {basename("NEW.PATH")}, {status_values});
+            END;"""
+        )
+        db.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS STATUS_DELETE INSTEAD OF DELETE ON STATUS
+            BEGIN
+                DELETE FROM STATUS_DATA
+                WHERE DIR = {dir_id("OLD.PATH")} AND NAME = {basename("OLD.PATH")};
+            END;"""
+        )
+        db.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS VARIANCE_INSERT INSTEAD OF INSERT ON VARIANCE
+            BEGIN
+                {register_dir("NEW.PATH")}
+                INSERT INTO VARIANCE_DATA (DIR, NAME, {variance_data_columns})
+                VALUES ({dir_id("NEW.PATH")}, {basename("NEW.PATH")}, {variance_values});
+            END;"""
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS STATUS_SHA256 ON STATUS_DATA (SHA256);")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS STATUS_SIZE_SHA256 ON STATUS_DATA (SIZE, SHA256);"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS STATUS_PENDING"
+            " ON STATUS_DATA (DIR, NAME) WHERE PENDING;"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS VARIANCE_TIME ON VARIANCE_DATA (TIME);")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS VARIANCE_SHA256 ON VARIANCE_DATA (SHA256);"
+        )
+
+    def __create_database(self) -> _lt.DbOperator:
+        """创建数据库"""
+        dbpath = self.__dbpath
+        _loguru.logger.info("创建数据库")
+        db = _lt.DbOperator(dbpath, profile=self.db_profile)
+        _loguru.logger.info("    初始化数据库表")
+        with db.transaction():
+            self._create_tables(db, self.path_layout)
+        # 载入基本数据
+        _loguru.logger.info("    初始化数据库基础数据")
+        self.__cache["db"] = db
+        self.__write_status(db, self.__gene_update_info, record_variance=False)
+        self.__cache["fresh_db"] = True
+        _loguru.logger.info("    完成")
+        return db
+
+    def layout_size_report(self) -> dict[str, int]:
+        """
+        将数据库中的STATUS表和VARIANCE表分别以"plain"和"normalized"方式存储到临时数据库,
+        比较两者的数据库文件大小(VACUUM之后)
+
+        Returns
+        ---
+        {存储方式: 数据库文件的字节数}
+        """
+        status_columns = ", ".join(self._status_column_name)
+        variance_columns = ", ".join(self._variance_column_name)
+        self._database.commit()
+
+        report = {}
+        with _tempfile.TemporaryDirectory() as tmpdir:
+            for layout in ("plain", "normalized"):
+                dbpath = _os.path.join(tmpdir, f"{layout}.db")
+                with _lt.DbOperator(dbpath) as db:
+                    db.execute("ATTACH DATABASE ? AS SOURCE;", (str(self.__dbpath),))
+                    with db.transaction():
+                        self._create_tables(db, layout)
+                        db.execute(
+                            f"INSERT INTO main.STATUS ({status_columns})"
+                            f" SELECT {status_columns} FROM SOURCE.STATUS ORDER BY PATH;"
+                        )
+                        db.execute(
+                            f"INSERT INTO main.VARIANCE ({variance_columns})"
+                            f" SELECT {variance_columns} FROM SOURCE.VARIANCE"
+                            " ORDER BY rowid;"
+                        )
+                    db.execute("DETACH DATABASE SOURCE;")
+                    db.execute("VACUUM;")
+                report[layout] = _os.path.getsize(dbpath)
+
+        _loguru.logger.info(
+            f"数据库'{self.__dbpath.name}'的大小: "
+            + ", ".join(f"{k} {v / 1048576:.2f}MiB" for k, v in report.items())
+            + f" (normalized / plain = {report['normalized'] / report['plain']:.1%})"
+        )
+        return report
+
+    def update_database(
+        self, relpaths: _typing.Iterable[str] | None = None
+    ) -> _lt.DbOperator:
+        """
+        根据文件夹当前状态, 更新数据库
+
+        Parameters
+        ---
+        relpaths : Iterable[str] | None, default = None
+            只重新统计这些相对路径(文件夹则包括其子树), 为None则扫描整个文件夹
+        """
+        db = self._database
+        info = self.__gene_update_info
+
+        _loguru.logger.info("更新数据库")
+        if self.__cache.pop("fresh_db", False):
+            # 数据库刚刚创建, STATUS表就是文件夹当前状态
+            db.insert_many("INFO", self._info_column_name, [info])
+        elif not db.select("INFO", "1").fetchone():
+            # 创建数据库时的首次扫描被中断, 继续首次扫描(不记录VARIANCE)
+            _loguru.logger.info("    继续被中断的首次扫描")
+            self.__write_status(db, info, record_variance=False)
+        else:
+            _loguru.logger.info("    扫描文件夹变动, 更新VARIANCE表与STATUS表")
+            self.__write_status(db, info, record_variance=True, relpaths=relpaths)
+        if self.tiered_verify:
+            _loguru.logger.info("    校验推迟计算的sha256")
+            self.verify_pending(self.verify_budget)
+        if self.__checkpoint_due:
+            _loguru.logger.info("    写入检查点")
+            self.write_checkpoint()
 
         _loguru.logger.info("    完成")
         return db
 
+    def watch(self, stop: _typing.Callable[[], bool] | None = None):
+        """
+        持续监视文件夹(Linux inotify), 增量更新数据库:
+        先完整更新一次, 之后将一段时间内的事件合并为变化的路径集合(见watch_settle、watch_max_delay),
+        只重新统计这些路径(新建、移入的文件夹则重新统计其子树), 每批在一个事务中写入STATUS、VARIANCE、INFO表。
+        事件队列溢出(丢失了事件)时, 进行一次完整更新。
+
+        Parameters
+        ---
+        stop : Callable[[], bool] | None, default = None
+            每次等待事件后调用, 返回True则停止监视(比如threading.Event().is_set), 为None则一直监视
+
+        Raises
+        ---
+        OSError
+            当前系统不支持inotify, 或超出监视数量上限
+        """
+        root = str(self.__root)
+        # 数据库文件本身也不监视(否则每次写入数据库都会产生新的事件)
+        ignored_paths = self.__ignored_paths | {str(self.__dbpath)}
+        overflow_mask = _lt.Inotify.IN_Q_OVERFLOW
+        self_mask = _lt.Inotify.IN_DELETE_SELF | _lt.Inotify.IN_MOVE_SELF
+
+        with _lt.Inotify() as inotify:
+            # 先添加监视再完整更新, 避免遗漏更新期间的变化
+            inotify.add_tree(root)
+            _loguru.logger.info(f"监视文件夹'{root}'({inotify.watch_count}个文件夹)")
+            self.update_database()
+
+            dirty: set[str] = set()
+            first_event = None
+            while stop is None or not stop():
+                events = inotify.read_events(self.watch_settle)
+                overflow = False
+                for path, mask in events:
+                    if mask & overflow_mask:
+                        overflow = True
+                    elif path == root:
+                        if mask & self_mask:
+                            _loguru.logger.warning(
+                                f"文件夹'{root}'被删除或移动, 停止监视"
+                            )
+                            return
+                    elif path not in ignored_paths:
+                        dirty.add(_os.path.relpath(path, root))
+                if dirty and first_event is None:
+                    first_event = _time.monotonic()
+
+                if overflow:
+                    _loguru.logger.warning("监视事件队列溢出, 完整更新数据库")
+                    inotify.add_tree(root)
+                    self.update_database()
+                    dirty.clear()
+                    first_event = None
+                elif dirty and (
+                    not events
+                    or _time.monotonic() - first_event >= self.watch_max_delay
+                ):
+                    self.update_database(dirty)
+                    dirty.clear()
+                    first_event = None
+
+            if dirty:
+                self.update_database(dirty)
+
+    @property
+    def __checkpoint_due(self) -> bool:
+        """距上一个检查点的更新次数或VARIANCE记录数是否达到阈值"""
+        db = self._database
+        (last_checkpoint,) = db.select("CHECKPOINT", "MAX(TIME)").fetchone()
+        last_checkpoint = -_math.inf if last_checkpoint is None else last_checkpoint
+        for table, threshold in (
+            ("INFO", self.checkpoint_interval),
+            ("VARIANCE", self.checkpoint_variance_rows),
+        ):
+            if threshold is None:
+                continue
+            (count,) = db.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE TIME > ? LIMIT ?);",
+                (last_checkpoint, threshold),
+            ).fetchone()
+            if count >= threshold:
+                return True
+        return False
+
+    def write_checkpoint(self) -> float:
+        """
+        将STATUS表(最后一次更新后的状态)的内容状态写入检查点, 并按checkpoint_retention删去旧的检查点
+
+        Returns
+        ---
+        检查点的时间(即最后一次更新的时间)
+        """
+        db = self._database
+        time_ = self.__last_update_time
+        columns = ("TIME", "CHUNK", "ROWS", "DATA")
+        cursor = db.select("STATUS", self._checkpoint_column_name, "ORDER BY PATH")
+        with db.transaction():
+            db.execute("DELETE FROM CHECKPOINT WHERE TIME = ?;", (time_,))
+            chunk = 0
+            for chunk, rows in enumerate(_batched(cursor, self.checkpoint_chunk_size)):
+                data = _zlib.compress(
+                    _json.dumps(
+                        rows, ensure_ascii=False, separators=(",", ":")
+                    ).encode()
+                )
+                db.insert_many(
+                    "CHECKPOINT",
+                    columns,
+                    [(time_, chunk, len(rows), data)],
+                    commit=False,
+                )
+            if not db.select("CHECKPOINT", "1", "WHERE TIME = ?", (time_,)).fetchone():
+                # STATUS表为空
+                db.insert_many(
+                    "CHECKPOINT",
+                    columns,
+                    [(time_, 0, 0, _zlib.compress(b"[]"))],
+                    commit=False,
+                )
+            if self.checkpoint_retention is not None:
+                db.execute(
+                    "DELETE FROM CHECKPOINT WHERE TIME NOT IN ("
+                    "SELECT DISTINCT TIME FROM CHECKPOINT ORDER BY TIME DESC LIMIT ?);",
+                    (self.checkpoint_retention,),
+                )
+        return time_
+
+    def __iter_checkpoint(
+        self, time_: float
+    ) -> _typing.Generator[_t_path_sta, None, None]:
+        """按PATH顺序生成检查点中的路径状态(没有文件元数据)"""
+        cursor = self._database.select(
+            "CHECKPOINT", "DATA", "WHERE TIME = ? ORDER BY CHUNK", (time_,)
+        )
+        try:
+            for (data,) in cursor:
+                for path, isfile, sha256, size, algo in _json.loads(
+                    _zlib.decompress(data)
+                ):
+                    yield (path, isfile, sha256, size) + (None,) * 6 + (algo,)
+        finally:
+            cursor.close()
+
+    def verify_pending(self, budget: int | None = None) -> int:
+        """
+        为分层检测中推迟计算sha256(待校验)的文件计算sha256。
+        sha256与记录不一致的文件, 在STATUS表中更新, 并在VARIANCE表中按最后一次更新的时间记为变动。
+
+        Parameters
+        ---
+        budget : int | None, default = None
+            本次校验读取的字节数预算(在预算用完前开始校验的文件会完整计算), 为None则校验全部
+
+        Returns
+        ---
+        校验的文件数
+        """
+        db = self._database
+        update_time = self.__last_update_time
+        fingerprint_block = self.fingerprint_block_size if self.tiered_verify else None
+        root = str(self.__root)
+        columns = ", ".join(self._status_column_name)
+        placeholder = ", ".join("?" * len(self._status_column_name))
+        last_path, verified, used = "", 0, 0
+
+        while budget is None or used < budget:
+            rows = db.execute(
+                f"SELECT {columns} FROM STATUS"
+                " WHERE PENDING AND PATH > ? ORDER BY PATH LIMIT ?;",
+                (last_path, self.work_unit_size),
+            ).fetchall()
+            if not rows:
+                break
+
+            updates, variance = [], []
+            for path_sta_old in rows:
+                relpath = last_path = path_sta_old[0]
+                if budget is not None and used >= budget:
+                    break
+                path = _os.path.join(root, relpath)
+                try:
+                    entry = ScanEntry(relpath, path, True, _os.stat(path))
+                except OSError:
+                    # 已被删除, 留给下一次扫描
+                    continue
+                path_sta_new = self._gene_path_status_of(
+                    entry,
+                    None,
+                    fingerprint_block=fingerprint_block,
+                    algorithm=self.hash_algorithm,
+                )
+                if path_sta_new is None:
+                    continue
+                used += path_sta_new[3]
+                verified += 1
+                updates.append(path_sta_new)
+                if kind := self._change_kind(path_sta_old, path_sta_new):
+                    change = (kind, path_sta_old, path_sta_new)
+                    variance.extend(self.__gene_variance(change, update_time))
+
+            with db.transaction():
+                db.executemany(
+                    f"INSERT OR REPLACE INTO STATUS ({columns}) VALUES ({placeholder});",
+                    updates,
+                )
+                db.insert_many(
+                    "VARIANCE", self._variance_column_name, variance, commit=False
+                )
+
+        return verified
+
+    @staticmethod
+    def _variance_events(where: str) -> str:
+        """
+        将VARIANCE记录展开为事件的子查询(移动展开为原路径的删去和新路径的新增), 列为
+        PATH ISFILE SHA256 SIZE TIME ADDED ALGO MOVE_FROM ID
+        MOVE_FROM为移动的原路径, ID为事件的顺序(同一时间内按记录的顺序)
+
+        Parameters
+        ---
+        where : str
+            筛选VARIANCE记录的条件(可以使用命名参数)
+        """
+        return f"""SELECT PATH, ISFILE, SHA256, SIZE, TIME, CHANGE != 0 AS ADDED, ALGO,
+            OLDPATH AS MOVE_FROM, rowid * 2 + 1 AS ID
+            FROM VARIANCE WHERE {where}
+        UNION ALL
+        SELECT OLDPATH, ISFILE, SHA256, SIZE, TIME, 0, ALGO, NULL, rowid * 2
+            FROM VARIANCE WHERE CHANGE = 2 AND ({where})"""
+
+    def snapshot_at(self, time_: float) -> _typing.Generator[_t_path_sta, None, None]:
+        """
+        重建文件夹在某一时间点的状态。
+        以当前的STATUS表, 或时间点前后最近的检查点为基础(选择与时间点之间VARIANCE记录最少的一个):
+        - 基础晚于时间点(回滚): 时间点之后第一条记录为删去的路径, 当时存在, 内容为该记录;
+          第一条记录为新增的路径, 当时不存在; 没有记录的路径与基础一致
+        - 基础早于时间点(前滚): 从基础到时间点最后一条记录为新增的路径, 当时存在, 内容为该记录;
+          最后一条记录为删去的路径, 当时不存在; 没有记录的路径与基础一致
+        早于数据库创建(且没有更早的检查点)的时间点, 得到的是创建时的状态。
+
+        Parameters
+        ---
+        time_ : float
+            时间点(包含该时间的更新)
+
+        Yields
+        ---
+        path_sta : tuple
+            按PATH排序的路径状态(可以作为diff_status的输入), 由VARIANCE表和检查点重建的行没有文件元数据(为None)
+        """
+        db = self._database
+
+        def count_variance(start: float, end: float) -> int:
+            (count,) = db.select(
+                "VARIANCE", "COUNT(*)", "WHERE TIME >= ? AND TIME <= ?", (start, end)
+            ).fetchone()
+            return count
+
+        (before,) = db.select(
+            "CHECKPOINT", "MAX(TIME)", "WHERE TIME <= ?", (time_,)
+        ).fetchone()
+        (after,) = db.select(
+            "CHECKPOINT", "MIN(TIME)", "WHERE TIME > ?", (time_,)
+        ).fetchone()
+        # (VARIANCE记录数, 基础的时间, 是否前滚), 基础的时间为None代表STATUS表
+        candidates = [(count_variance(time_, _math.inf), None, False)]
+        if after is not None:
+            candidates.append((count_variance(time_, after), after, False))
+        if before is not None:
+            candidates.append((count_variance(before, time_), before, True))
+        _, base_time, forward = min(candidates, key=_operator.itemgetter(0))
+
+        if base_time is None:
+            base = db.select("STATUS", self._status_column_name, "ORDER BY PATH")
+        else:
+            base = self.__iter_checkpoint(base_time)
+        if forward:
+            # 基础时间的记录也要重放(检查点可能早于同一时间的校验记录), 取每个路径的最后一条记录
+            where, order = "TIME >= :start AND TIME <= :end", "DESC"
+            start, end, keep_change = base_time, time_, True
+        else:
+            where, order = "TIME > :start AND TIME <= :end", "ASC"
+            start, end = time_, _math.inf if base_time is None else base_time
+            keep_change = False
+        events = db.execute(
+            f"""WITH EVENT AS ({self._variance_events(where)}),
+            RANKED AS (
+                SELECT PATH, ISFILE, SHA256, SIZE, ADDED, ALGO, ROW_NUMBER() OVER (
+                    PARTITION BY PATH ORDER BY TIME {order}, ID {order}
+                ) AS RN
+                FROM EVENT
+            )
+            SELECT PATH, ISFILE, SHA256, SIZE, ADDED, ALGO FROM RANKED WHERE RN = 1
+            ORDER BY PATH;""",
+            {"start": start, "end": end},
+        )
+
+        try:
+            for path_sta, event in _merge_join(base, events):
+                if event is None:
+                    yield tuple(path_sta)
+                elif bool(event[4]) == keep_change:
+                    yield tuple(event[:4]) + (None,) * 6 + (event[5],)
+        finally:
+            events.close()
+            if base_time is None:
+                base.close()
+
     def combine_variance(
         self,
         start_time: float = 0,
         end_time: float = None,
         include_left: bool = True,
         include_right: bool = True,
-    ) -> tuple[_t_list_variance, _t_list_variance]:
+        moves: bool = False,
+    ) -> tuple[_typing.Iterator[_t_variance], ...]:
         """
+        将时间范围内的多个VARIANCE记录合并为净变化:
+        移动展开为原路径的删去和新路径的新增, 每个(PATH, SHA256)只保留最后一次记录,
+        最后一次为新增则属于added, 为删去则属于deleted。
+        合并在SQL中完成(窗口函数), 中间结果存入带索引的临时表(下次合并时删去), 结果以游标流式返回,
+        内存占用与结果大小相关, 与历史记录的多少无关。
+
         Paramters
         ---
         start_time, end_time : float
-            将start_time到end_time范围内的多个VARIANCE记录合并为两个列表并返回
+            时间范围, end_time为None则为现在
         include_left, include_right : bool
             是否包含左区间边界/右区间边界
+        moves : bool, default = False
+            是否单独返回移动: 时间范围开始前已存在的内容被移动到新路径(且最后仍在新路径),
+            则从added和deleted中移出, 放入moved(OLDPATH为时间范围开始前的路径)
         Returns
         ---
-        added_item_list, deleted_item_list
+        added_item_iter, deleted_item_iter(, moved_item_iter) : Iterator[tuple]
+            按时间排序的VARIANCE记录(CHANGE为2代表由移动而来, OLDPATH为原路径)
         """
         end_time = _time.time() if end_time is None else end_time
+        where = (
+            f"TIME {'>=' if include_left else '>'} :start"
+            f" AND TIME {'<=' if include_right else '<'} :end"
+        )
+        columns = (
+            "PATH, ISFILE, SHA256, SIZE, TIME,"
+            " CASE WHEN MOVE_FROM IS NULL THEN ADDED ELSE 2 END AS CHANGE,"
+            " ALGO, MOVE_FROM AS OLDPATH"
+        )
+        parameters = {"start": start_time, "end": end_time}
 
-        added_item: dict[tuple[str, str], self._t_variance] = {}
-        deleted_item: dict[tuple[str, str], self._t_variance] = {}
+        db = self._database
+        self.__drop_combined_tables()
+        self.__combined_serial += 1
+        last_event = f"COMBINE_LAST_{self.__combined_serial}"
+        moved = f"COMBINE_MOVED_{self.__combined_serial}"
+        # 每个(PATH, SHA256)的最后一次记录落到带索引的临时表, 移动链和筛选都按(PATH, SHA256)查找
+        self.__combined_tables.append(last_event)
+        db.execute(
+            f"""CREATE TEMP TABLE {last_event} AS
+            WITH EVENT AS ({self._variance_events(where)}),
+            RANKED AS (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY PATH, SHA256 ORDER BY TIME DESC, ID DESC
+                ) AS RN, FIRST_VALUE(ADDED) OVER (
+                    PARTITION BY PATH, SHA256 ORDER BY TIME, ID
+                ) AS FIRST_ADDED, FIRST_VALUE(MOVE_FROM) OVER (
+                    PARTITION BY PATH, SHA256 ORDER BY TIME, ID
+                ) AS FIRST_MOVE_FROM
+                FROM EVENT
+            )
+            SELECT PATH, ISFILE, SHA256, SIZE, TIME, ADDED, ALGO, MOVE_FROM, ID,
+            FIRST_ADDED, FIRST_MOVE_FROM FROM RANKED WHERE RN = 1;""",
+            parameters,
+        )
+        db.execute(
+            f"CREATE INDEX temp.{last_event}_KEY ON {last_event} (PATH, SHA256);"
+        )
+        added = f"SELECT {columns} FROM {last_event} WHERE ADDED"
+        deleted = f"SELECT {columns} FROM {last_event} WHERE NOT ADDED"
+        if not moves:
+            return (
+                db.execute(f"{added} ORDER BY TIME, ID;"),
+                db.execute(f"{deleted} ORDER BY TIME, ID;"),
+            )
 
-        variance_list: self._t_list_variance = self._database.select(
-            "VARIANCE",
-            self._variance_column_name,
-            f"""WHERE
-            TIME {'>=' if include_left else '>'} {start_time}
-            AND
-            TIME {'<=' if include_right else '<'} {end_time}
-            ORDER BY TIME""",
-        )
-
-        for path, isfile, sha256, size, time, change in variance_list:
-            key = (path, sha256)
-            value = (path, isfile, sha256, size, time, change)
-
-            if change:
-                assert key not in added_item
-                added_item[key] = value
-                deleted_item.pop(key, None)
-            else:
-                assert key not in deleted_item
-                deleted_item[key] = value
-                added_item.pop(key, None)
+        # 沿移动链(a -> b -> c)向前找到移动的原路径, 原路径在时间范围内第一次记录为删去(开始前已存在),
+        # 最后一次也为删去, 才是净移动
+        self.__combined_tables.append(moved)
+        db.execute(f"""CREATE TEMP TABLE {moved} AS
+            WITH RECURSIVE CHAIN (PATH, SHA256, ORIGIN) AS (
+                SELECT PATH, SHA256, MOVE_FROM FROM {last_event}
+                WHERE ADDED AND MOVE_FROM IS NOT NULL
+                UNION
+                SELECT C.PATH, C.SHA256, S.FIRST_MOVE_FROM
+                FROM CHAIN AS C JOIN {last_event} AS S
+                ON S.PATH = C.ORIGIN AND S.SHA256 IS C.SHA256
+                WHERE S.FIRST_ADDED AND S.FIRST_MOVE_FROM IS NOT NULL
+            )
+            SELECT A.PATH, A.ISFILE, A.SHA256, A.SIZE, A.TIME, A.ADDED, A.ALGO,
+            C.ORIGIN AS MOVE_FROM, A.ID
+            FROM {last_event} AS A
+            JOIN CHAIN AS C ON C.PATH = A.PATH AND C.SHA256 IS A.SHA256
+            JOIN {last_event} AS S ON S.PATH = C.ORIGIN AND S.SHA256 IS C.SHA256
+            WHERE NOT S.ADDED AND NOT S.FIRST_ADDED;""")
+        db.execute(f"CREATE INDEX temp.{moved}_PATH ON {moved} (PATH, SHA256);")
+        db.execute(f"CREATE INDEX temp.{moved}_FROM ON {moved} (MOVE_FROM, SHA256);")
+        not_moved = (
+            f"NOT EXISTS (SELECT 1 FROM {moved} AS M"
+            f" WHERE M.{{}} = {last_event}.PATH AND M.SHA256 IS {last_event}.SHA256)"
+        )
+        added_item_iter = db.execute(
+            f"{added} AND {not_moved.format('PATH')} ORDER BY TIME, ID;"
+        )
+        deleted_item_iter = db.execute(
+            f"{deleted} AND {not_moved.format('MOVE_FROM')} ORDER BY TIME, ID;"
+        )
+        moved_item_iter = db.execute(
+            f"SELECT {columns} FROM {moved} ORDER BY TIME, ID;"
+        )
+        return added_item_iter, deleted_item_iter, moved_item_iter
+
+    def __drop_combined_tables(self):
+        """删去之前合并时创建的临时表, 返回的游标仍在读取的表留到下一次"""
+        remaining = []
+        for table in self.__combined_tables:
+            try:
+                self._database.execute(f"DROP TABLE IF EXISTS temp.{table};")
+            except _sqlite3.OperationalError:
+                remaining.append(table)
+        self.__combined_tables = remaining
+
+    def duplicates(
+        self, min_size: int = 1
+    ) -> _typing.Generator[tuple[int, str, list[str], int], None, None]:
+        """
+        根据STATUS表(最后一次更新时的状态)查找内容重复的文件, 按(SIZE, SHA256)分组(使用索引)。
+        哈希算法不同的文件不会被分为一组; 分层检测中待校验的文件使用记录的哈希。
 
-        added_item_list: self._t_list_variance = list(added_item.values())
-        deleted_item_list: self._t_list_variance = list(deleted_item.values())
+        Parameters
+        ---
+        min_size : int, default = 1
+            只查找不小于该大小的文件(默认跳过空文件)
 
-        return added_item_list, deleted_item_list
+        Yields
+        ---
+        size : int
+            文件大小
+        sha256 : str
+            文件的哈希
+        paths : list[str]
+            内容相同的文件的相对路径(至少2个)
+        reclaimable : int
+            只保留一份时可以节省的字节数, 即size * (文件数 - 1), 硬链接(INODE、DEV相同)视为同一文件
+        """
+        cursor = self._database.execute(
+            """SELECT SIZE, SHA256, ALGO, PATH, INODE, DEV FROM STATUS
+            WHERE ISFILE AND SIZE >= :min_size AND (SIZE, SHA256, ALGO) IN (
+                SELECT SIZE, SHA256, ALGO FROM STATUS
+                WHERE ISFILE AND SIZE >= :min_size AND SHA256 IS NOT NULL
+                GROUP BY SIZE, SHA256, ALGO HAVING COUNT(*) > 1
+            )
+            ORDER BY SIZE DESC, SHA256, ALGO, PATH;""",
+            {"min_size": min_size},
+        )
+        total = 0
+        try:
+            for (size, sha256, _), rows in _itertools.groupby(
+                cursor, _operator.itemgetter(0, 1, 2)
+            ):
+                rows = list(rows)
+                paths = [i[3] for i in rows]
+                files = {i[3] if i[4] is None else i[4:6] for i in rows}
+                reclaimable = size * (len(files) - 1)
+                total += reclaimable
+                yield size, sha256, paths, reclaimable
+        finally:
+            cursor.close()
+        _loguru.logger.info(f"重复文件可节省{total / 1048576:.2f}MiB")
+
+    @staticmethod
+    def scan_duplicates(
+        folder_path: str | _pathlib.Path,
+        min_size: int = 1,
+        algorithm: str = "sha256",
+        block_size: int = 65536,
+        jobs: int = 1,
+    ) -> _typing.Generator[tuple[int, str, list[str], int], None, None]:
+        """
+        不使用数据库, 直接扫描文件夹查找内容重复的文件:
+        先按大小分组(大小唯一的文件不会被读取), 再按抽样指纹(首、中、尾各block_size字节)分组, 最后按完整哈希分组。
+        硬链接(同一文件)只计算一次; 不进入指向文件夹的符号链接。
+
+        Parameters
+        ---
+        folder_path : str | pathlib.Path
+            文件夹路径
+        min_size : int, default = 1
+            只查找不小于该大小的文件(默认跳过空文件)
+        algorithm : str, default = "sha256"
+            完整哈希的算法(见litetools.Hash.algorithms)
+        block_size : int, default = 65536
+            抽样指纹的块大小
+        jobs : int, default = 1
+            计算哈希的线程数
+
+        Yields
+        ---
+        与duplicates相同: (size, 哈希, 相对路径列表, reclaimable), 按大小降序
+        """
+        root = str(_pathlib.Path(folder_path).absolute())
+        by_size: dict[int, list[str]] = _collections.defaultdict(list)
+        seen_inodes: set[tuple[int, int]] = set()
+        stack = [root]
+        while stack:
+            try:
+                with _os.scandir(stack.pop()) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.st_size < min_size:
+                    continue
+                if stat.st_nlink > 1:
+                    if (stat.st_dev, stat.st_ino) in seen_inodes:
+                        continue
+                    seen_inodes.add((stat.st_dev, stat.st_ino))
+                by_size[stat.st_size].append(entry.path)
+
+        def group_by(func, paths: list[str], executor) -> list[list[str]]:
+            groups = _collections.defaultdict(list)
+            for path, key in zip(paths, executor.map(func, paths)):
+                if key is not None:
+                    groups[key].append(path)
+            return [i for i in groups.values() if len(i) > 1]
+
+        total = 0
+        with _futures.ThreadPoolExecutor(max(jobs, 1)) as executor:
+            for size in sorted(by_size, reverse=True):
+                paths = by_size[size]
+                if len(paths) < 2:
+                    continue
+                if size > 3 * block_size:
+                    fingerprint = _functools.partial(
+                        FolderStatus._cal_fingerprint, size=size, block_size=block_size
+                    )
+                    candidates = group_by(fingerprint, paths, executor)
+                else:
+                    # 抽样即整个文件, 直接计算完整哈希
+                    candidates = [paths]
+                full_hash = _functools.partial(
+                    FolderStatus._cal_hash, algorithm=algorithm
+                )
+                for candidate in candidates:
+                    hashes = list(executor.map(full_hash, candidate))
+                    groups = _collections.defaultdict(list)
+                    for path, hash_ in zip(candidate, hashes):
+                        if hash_ is not None:
+                            groups[hash_].append(_os.path.relpath(path, root))
+                    for hash_, group in groups.items():
+                        if len(group) < 2:
+                            continue
+                        reclaimable = size * (len(group) - 1)
+                        total += reclaimable
+                        yield size, hash_, sorted(group), reclaimable
+        _loguru.logger.info(f"重复文件可节省{total / 1048576:.2f}MiB")
+
+    @property
+    def _path_layout(self) -> str:
+        """数据库中路径的存储方式(见path_layout)"""
+        row = self._database.select(
+            "META", "VALUE", "WHERE KEY = ?", ("path_layout",)
+        ).fetchone()
+        return "plain" if row is None else row[0]
+
+    def compact_history(
+        self,
+        cutoff: float,
+        vacuum: _typing.Literal["full", "incremental"] | None = "full",
+        dry_run: bool = False,
+    ) -> dict[str, int | bool]:
+        """
+        压缩cutoff(含)之前的VARIANCE记录为净变化(与combine_variance的合并方式相同):
+        每个(PATH, SHA256)只保留最后一次记录, 若最后一次为删去而第一次为新增(期间新增又删去的项目), 则全部删去。
+        移动的原路径和新路径都保留时仍记录为移动(连续的移动合并为一条), 只保留一侧时改为新增或删去。
+        INFO表(更新的时间线)保留不变, 之后的记录不受影响; cutoff(含)之前的检查点一并删去
+        (从这些检查点前滚会用到已被压缩的记录), 因此cutoff之后的历史查询结果不变;
+        cutoff之前的时间点, snapshot_at只能得到近似的结果。
+
+        Parameters
+        ---
+        cutoff : float
+            压缩该时间(含)之前的记录
+        vacuum : "full" | "incremental" | None, default = "full"
+            压缩后回收数据库文件空间的方式:
+            "full"为VACUUM(重建数据库, 需要与数据库大小相当的临时空间),
+            "incremental"为incremental_vacuum(首次使用时需要一次VACUUM以启用), None为不回收(空间留待复用)
+        dry_run : bool, default = False
+            只统计, 不修改数据库(节省的字节数为估计值)
+
+        Returns
+        ---
+        {"rows": 删去的记录数, "inserted": 改写出的删去记录数(移动只保留原路径一侧),
+        "checkpoints": 删去的检查点数, "bytes_before": 压缩前的文件大小, "bytes_after": 压缩后的文件大小,
+        "bytes_saved": 节省的字节数, "dry_run": 是否为试运行}
+        """
+        db = self._database
+        table = "VARIANCE_DATA" if self._path_layout == "normalized" else "VARIANCE"
+        variance_columns = ", ".join(self._variance_column_name)
+        # 每个(PATH, SHA256)的最后一次事件(移动展开为原路径的删去和新路径的新增, 见_variance_events)
+        last_event = f"""CREATE TEMP TABLE COMPACT_LAST AS
+            WITH EVENT AS ({self._variance_events("TIME <= :cutoff")}),
+            RANKED AS (
+                SELECT PATH, SHA256, ADDED, ID, ROW_NUMBER() OVER (
+                    PARTITION BY PATH, SHA256 ORDER BY TIME DESC, ID DESC
+                ) AS RN, FIRST_VALUE(ADDED) OVER (
+                    PARTITION BY PATH, SHA256 ORDER BY TIME, ID
+                ) AS FIRST_ADDED, FIRST_VALUE(MOVE_FROM) OVER (
+                    PARTITION BY PATH, SHA256 ORDER BY TIME, ID
+                ) AS FIRST_MOVE_FROM, MOVE_FROM
+                FROM EVENT
+            )
+            SELECT * FROM RANKED WHERE RN = 1;"""
+        # 与combine_variance相同, 沿移动链找到压缩后仍删去的原路径, 其删去事件并入移动记录
+        moved = """INSERT OR IGNORE INTO temp.COMPACT_MOVED (ID, ORIGIN, ABSORBED_ID)
+            WITH RECURSIVE CHAIN (PATH, SHA256, ID, ORIGIN) AS (
+                SELECT PATH, SHA256, ID, MOVE_FROM FROM temp.COMPACT_LAST
+                WHERE ADDED AND MOVE_FROM IS NOT NULL
+                UNION
+                SELECT C.PATH, C.SHA256, C.ID, S.FIRST_MOVE_FROM
+                FROM CHAIN AS C JOIN temp.COMPACT_LAST AS S
+                ON S.PATH = C.ORIGIN AND S.SHA256 IS C.SHA256
+                WHERE S.FIRST_ADDED AND S.FIRST_MOVE_FROM IS NOT NULL
+            )
+            SELECT C.ID, C.ORIGIN, S.ID FROM CHAIN AS C JOIN temp.COMPACT_LAST AS S
+            ON S.PATH = C.ORIGIN AND S.SHA256 IS C.SHA256
+            WHERE NOT S.ADDED AND NOT S.FIRST_ADDED;"""
+        # 保留的事件: 最后一次记录, 且不是期间新增又删去的项目, 且没有并入移动记录
+        keep = """INSERT INTO temp.COMPACT_KEEP (ID)
+            SELECT ID FROM temp.COMPACT_LAST WHERE (ADDED OR NOT FIRST_ADDED)
+            AND ID NOT IN (SELECT ABSORBED_ID FROM temp.COMPACT_MOVED);"""
+        kept = "IN (SELECT ID FROM temp.COMPACT_KEEP)"
+
+        def file_size() -> int:
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+            return self.__dbpath.stat().st_size
+
+        def compact() -> tuple[int, int]:
+            """
+            每条记录按保留的事件处理: 移动记录的新增保留则仍为移动(原路径取移动链的起点),
+            找不到原路径则改为新增; 只保留删去则改写为原路径的删去记录; 其他记录全部删去
+
+            Returns
+            ---
+            (删去的记录数, 新增的记录数, 删去的检查点数)
+            """
+            parameters = {"cutoff": cutoff}
+            db.execute(last_event, parameters)
+            db.execute(
+                "CREATE INDEX temp.COMPACT_LAST_KEY ON COMPACT_LAST (PATH, SHA256);"
+            )
+            db.execute(
+                "CREATE TEMP TABLE COMPACT_MOVED"
+                " (ID INTEGER PRIMARY KEY, ORIGIN TEXT, ABSORBED_ID INTEGER);"
+            )
+            db.execute(moved)
+            db.execute("CREATE TEMP TABLE COMPACT_KEEP (ID INTEGER PRIMARY KEY);")
+            db.execute(keep)
+            db.execute(
+                f"CREATE TEMP TABLE COMPACT_REWRITE AS SELECT {variance_columns}"
+                f" FROM VARIANCE WHERE TIME <= :cutoff AND CHANGE = 2"
+                f" AND rowid * 2 + 1 NOT {kept} AND rowid * 2 {kept} ORDER BY rowid;",
+                parameters,
+            )
+            db.execute(
+                f"""UPDATE {table} SET OLDPATH = (
+                    SELECT ORIGIN FROM temp.COMPACT_MOVED WHERE ID = {table}.rowid * 2 + 1
+                ) WHERE TIME <= :cutoff AND CHANGE = 2
+                AND rowid * 2 + 1 IN (SELECT ID FROM temp.COMPACT_MOVED);""",
+                parameters,
+            )
+            db.execute(
+                f"""UPDATE {table} SET CHANGE = 1, OLDPATH = NULL
+                WHERE TIME <= :cutoff AND CHANGE = 2 AND rowid * 2 + 1 {kept}
+                AND rowid * 2 + 1 NOT IN (SELECT ID FROM temp.COMPACT_MOVED);""",
+                parameters,
+            )
+            deleted = db.execute(
+                f"DELETE FROM {table} WHERE TIME <= :cutoff AND rowid * 2 + 1 NOT {kept};",
+                parameters,
+            ).rowcount
+            (inserted,) = db.execute(
+                "SELECT COUNT(*) FROM temp.COMPACT_REWRITE;"
+            ).fetchone()
+            db.execute(
+                f"INSERT INTO VARIANCE ({variance_columns})"
+                " SELECT OLDPATH, ISFILE, SHA256, SIZE, TIME, 0, ALGO, NULL"
+                " FROM temp.COMPACT_REWRITE ORDER BY rowid;"
+            )
+            for name in (
+                "COMPACT_LAST",
+                "COMPACT_MOVED",
+                "COMPACT_KEEP",
+                "COMPACT_REWRITE",
+            ):
+                db.execute(f"DROP TABLE temp.{name};")
+            (checkpoints,) = db.select(
+                "CHECKPOINT", "COUNT(DISTINCT TIME)", "WHERE TIME <= ?", (cutoff,)
+            ).fetchone()
+            db.execute("DELETE FROM CHECKPOINT WHERE TIME <= ?;", (cutoff,))
+            return deleted, inserted, checkpoints
+
+        db.commit()
+        bytes_before = file_size()
+        if dry_run:
+            (page_size,) = db.execute("PRAGMA page_size;").fetchone()
+            db.execute("BEGIN")
+            try:
+                rows, inserted, checkpoints = compact()
+                (freelist,) = db.execute("PRAGMA freelist_count;").fetchone()
+            finally:
+                db.rollback()
+            bytes_after = bytes_before - freelist * page_size
+        else:
+            _loguru.logger.info(f"压缩{cutoff}之前的VARIANCE记录")
+            with db.transaction():
+                rows, inserted, checkpoints = compact()
+            match vacuum:
+                case "full":
+                    db.execute("VACUUM;")
+                case "incremental":
+                    (auto_vacuum,) = db.execute("PRAGMA auto_vacuum;").fetchone()
+                    if auto_vacuum != 2:
+                        db.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+                        db.execute("VACUUM;")
+                    db.execute("PRAGMA incremental_vacuum;")
+                case None:
+                    pass
+                case _:
+                    raise ValueError(f"Unknown vacuum mode ({vacuum}).")
+            bytes_after = file_size()
+
+        report = {
+            "rows": rows,
+            "inserted": inserted,
+            "checkpoints": checkpoints,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_saved": bytes_before - bytes_after,
+            "dry_run": dry_run,
+        }
+        _loguru.logger.info(
+            f"{'(试运行)' if dry_run else ''}删去{rows}条、改写出{inserted}条VARIANCE记录"
+            f"和{checkpoints}个检查点, "
+            f"数据库文件 {bytes_before / 1048576:.2f}MiB -> {bytes_after / 1048576:.2f}MiB"
+        )
+        return report
 
     def extract_new_files(
         self,
@@ -575,12 +2630,15 @@ class FolderStatus:
         """
         if update:
             self.update_database()
+        # 导出前, 校验所有推迟计算的sha256
+        self.verify_pending()
 
         sha256_set: set = set()
         output = _pathlib.Path(output)
 
-        added, _ = self.combine_variance(start_time, include_left=False)
-        added = _tqdm.tqdm(list(added), desc=f"导出'{self.__root.name}'中的新增文件")
+        # 移动而来的文件内容此前已经存在, 不导出
+        added, _, _ = self.combine_variance(start_time, include_left=False, moves=True)
+        added = _tqdm.tqdm(added, desc=f"导出'{self.__root.name}'中的新增文件")
 
         match archive:
             case None:
@@ -598,19 +2656,20 @@ class FolderStatus:
                 raise ValueError(f"Unknown type of archive ({type(archive)}).")
         extract_method: _typing.Callable[[_pathlib.Path, str], None]
 
-        for path, _, sha256, size, _, _ in added:
+        for path, _, sha256, size, _, _, algo, _ in added:
             file_path = self.__root / path
             if file_path.is_dir():
                 continue
             if not file_path.is_file():
                 _loguru.logger.debug(f"'{file_path}'不存在")
                 continue
+            algo = algo or "sha256"
             if file_path == self.__dbpath:
-                # status.db重新计算sha256
-                sha256 = self._cal_sha256(file_path)
+                # status.db重新计算哈希
+                sha256 = self._cal_hash(file_path, algo)
             if size != file_path.stat().st_size:
-                # 简单检查文件是否被修改, 如果被修改, 重新计算sha256
-                sha256 = self._cal_sha256(file_path)
+                # 简单检查文件是否被修改, 如果被修改, 重新计算哈希
+                sha256 = self._cal_hash(file_path, algo)
             if not sha256:
                 continue
             if sha256 in sha256_set:
@@ -621,12 +2680,519 @@ class FolderStatus:
             new_path = f"{sha256}{file_path.suffix}"  # TODO no suffix
             extract_method(file_path, new_path)
 
+        # 将WAL日志中的内容写回数据库文件, 再导出
+        self._database.execute("PRAGMA wal_checkpoint(TRUNCATE);")
         extract_method(self.__dbpath, "status.db")
         match archive:
             case str():
                 archive_file.close()
 
 
+class BatchUpdate:
+    """
+    在同一进程中批量更新多个「对象」文件夹的状态数据库
+
+    所有文件夹共用一个计算哈希的执行器(按FolderStatus.scan_backend创建), 并按文件夹所在的设备(st_dev)限制并发:
+    每个设备上同时更新folders_per_device个文件夹, 同时计算jobs_per_device个哈希,
+    不同设备上的文件夹同时更新, 从而让多个磁盘的读取重叠, 又不会让单个磁盘过载。
+    """
+
+    jobs: int = 0  # 共用执行器的并发数, 小于1则使用CPU核心数
+    jobs_per_device: int = 2  # 每个设备上同时计算哈希的任务数
+    folders_per_device: int = 1  # 每个设备上同时更新的文件夹数
+
+    def __init__(self, roots: _typing.Iterable[str | _pathlib.Path]) -> None:
+        """
+        Parameters
+        ---
+        roots : Iterable[str | pathlib.Path]
+            「对象」文件夹的路径
+        """
+        self.roots = [_pathlib.Path(i).absolute() for i in roots]
+
+    @classmethod
+    def discover(
+        cls, search_root: str | _pathlib.Path, max_depth: int | None = None
+    ) -> "BatchUpdate":
+        """
+        在文件夹中查找「对象」文件夹(不进入找到的「对象」文件夹和指向文件夹的符号链接)
+
+        Parameters
+        ---
+        search_root : str | pathlib.Path
+            查找的文件夹
+        max_depth : int | None, default = None
+            查找的最大深度(search_root为0), 为None则不限
+        """
+        search_root = _pathlib.Path(search_root).absolute()
+        roots = []
+        for dirpath, dirnames, _ in _os.walk(search_root):
+            if any(i.startswith(".fmi") for i in dirnames):
+                try:
+                    ObjectFolder.find_fmi(dirpath)
+                except OSError:
+                    pass
+                else:
+                    roots.append(dirpath)
+                    dirnames.clear()
+                    continue
+            depth = len(_pathlib.Path(dirpath).relative_to(search_root).parts)
+            if max_depth is not None and depth >= max_depth:
+                dirnames.clear()
+            dirnames.sort()
+        _loguru.logger.info(f"在'{search_root}'中找到{len(roots)}个「对象」文件夹")
+        return cls(roots)
+
+    def run(self) -> list[dict]:
+        """
+        更新所有文件夹的状态数据库(单个文件夹出错不影响其他文件夹)
+
+        Returns
+        ---
+        与roots一一对应的总结: {
+            "root": 文件夹路径, "device": 设备号, "seconds": 耗时,
+            "files": 文件数, "added": 新增, "deleted": 删去, "moved": 移动(本次更新的VARIANCE记录数),
+            "error": 出错时的错误信息, 否则为None
+        }
+        """
+        if not self.roots:
+            return []
+
+        groups: dict[int | None, list[int]] = _collections.defaultdict(list)
+        for idx, root in enumerate(self.roots):
+            try:
+                device = root.stat().st_dev
+            except OSError:
+                device = None
+            groups[device].append(idx)
+
+        max_workers = self.jobs if self.jobs >= 1 else (_os.cpu_count() or 1)
+        match FolderStatus.scan_backend:
+            case "thread" | "asyncio":
+                shared = _futures.ThreadPoolExecutor(max_workers)
+            case "process":
+                shared = _futures.ProcessPoolExecutor(max_workers)
+            case _:
+                raise ValueError(f"Unknown scan backend ({FolderStatus.scan_backend}).")
+
+        summaries: list[dict | None] = [None] * len(self.roots)
+        # 每个设备folders_per_device个线程, 依次更新该设备上的文件夹
+        queues = {
+            device: _collections.deque(indices) for device, indices in groups.items()
+        }
+        lock = _threading.Lock()
+
+        def drive(device: int | None, executor: _futures.Executor):
+            queue = queues[device]
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    idx = queue.popleft()
+                summaries[idx] = self.__update_one(self.roots[idx], device, executor)
+
+        with (
+            shared,
+            _futures.ThreadPoolExecutor(
+                len(groups) * self.folders_per_device
+            ) as drivers,
+        ):
+            futures = []
+            for device in groups:
+                executor = _LimitedExecutor(shared, self.jobs_per_device)
+                for _ in range(self.folders_per_device):
+                    futures.append(drivers.submit(drive, device, executor))
+            for future in futures:
+                future.result()
+
+        for summary in summaries:
+            if summary["error"] is None:
+                _loguru.logger.info(
+                    f"'{summary['root']}': {summary['files']}个文件, 新增{summary['added']},"
+                    f" 删去{summary['deleted']}, 移动{summary['moved']}, 用时{summary['seconds']:.1f}s"
+                )
+            else:
+                _loguru.logger.error(
+                    f"'{summary['root']}': 更新失败 ({summary['error']})"
+                )
+        return summaries
+
+    def __update_one(
+        self, root: _pathlib.Path, device: int | None, executor: _futures.Executor
+    ) -> dict:
+        """更新一个文件夹的状态数据库, 返回总结"""
+        summary = {
+            "root": str(root),
+            "device": device,
+            "seconds": 0.0,
+            "files": None,
+            "added": None,
+            "deleted": None,
+            "moved": None,
+            "error": None,
+        }
+        start = _time.monotonic()
+        folder_status = None
+        try:
+            folder_status = ObjectFolder(root).folder_status
+            folder_status.executor = executor
+            folder_status.jobs = self.jobs_per_device
+            db = folder_status.update_database()
+            (summary["files"],) = db.select(
+                "STATUS", "COUNT(*)", "WHERE ISFILE"
+            ).fetchone()
+            counts = dict(
+                db.execute(
+                    "SELECT CHANGE, COUNT(*) FROM VARIANCE"
+                    " WHERE TIME = (SELECT MAX(TIME) FROM INFO) GROUP BY CHANGE;"
+                ).fetchall()
+            )
+            summary["added"] = counts.get(1, 0)
+            summary["deleted"] = counts.get(0, 0)
+            summary["moved"] = counts.get(2, 0)
+        except Exception as e:
+            _loguru.logger.exception(f"更新'{root}'时出错")
+            summary["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            if folder_status is not None:
+                folder_status.close()
+        summary["seconds"] = _time.monotonic() - start
+        return summary
+
+
+class _SubtreeUnit(_typing.NamedTuple):
+    """交给子进程遍历的子树(见FolderStatus.__process_units)"""
+
+    reldir: str
+    # 子树内按PATH排序的旧状态
+    old: list
+    # 子树内按PATH排序的SCAN_PROGRESS记录
+    progress: list
+
+
+def _scan_work_unit(
+    unit: list,
+    root: str = "",
+    dbpath: str = "",
+    stat_dirs: bool = False,
+    prune: bool = False,
+    fast_scan: bool = True,
+    last_update_time: float = 0,
+    fingerprint_block: int | None = None,
+    algorithm: str = "sha256",
+) -> list[tuple[FolderStatus._t_path_sta | None, FolderStatus._t_path_sta | None]]:
+    """
+    统计一个工作单元内的路径状态(scan_backend == "process"时在子进程中运行)
+
+    Parameters
+    ---
+    unit : list
+        工作单元, 元素为(数据库中的路径状态, 遍历得到的项目, 可沿用的路径状态),
+        项目为相对路径时在此stat; 或为_SubtreeUnit, 在此遍历整个子树(见FolderStatus.__process_units)
+    root, dbpath : str, default = ""
+        文件夹路径和数据路径(遍历子树时使用)
+    stat_dirs, prune : bool, default = False
+        遍历子树时是否对文件夹进行stat、是否进行文件夹剪枝
+    fast_scan : bool, default = True
+        是否参照可沿用的路径状态跳过计算哈希
+    last_update_time : float, default = 0
+        数据库最后一次更新的时间
+    fingerprint_block : int | None, default = None
+        分层检测的抽样块大小, 为None则不进行分层检测
+    algorithm : str, default = "sha256"
+        计算哈希的算法
+
+    Returns
+    ---
+    按路径顺序排列的(旧路径状态, 新路径状态), 路径不存在或统计出错的一侧为None
+    """
+    walker = None
+    results = []
+    for item in unit:
+        if isinstance(item, _SubtreeUnit):
+            if walker is None:
+                walker = FolderStatus(root, dbpath)
+            items = walker._scan_subtree(item, stat_dirs, prune)
+        else:
+            items = (item,)
+        for path_sta_old, entry, path_sta_reuse in items:
+            if isinstance(entry, str):
+                path = _os.path.join(root, entry)
+                try:
+                    entry = ScanEntry(entry, path, True, _os.stat(path))
+                except OSError:
+                    entry = None
+            if entry is None:
+                if path_sta_old is not None:
+                    results.append((path_sta_old, None))
+                continue
+            path_sta_new = FolderStatus._gene_path_status_of(
+                entry,
+                path_sta_reuse if fast_scan else None,
+                last_update_time,
+                fingerprint_block,
+                algorithm,
+            )
+            results.append((path_sta_old, path_sta_new))
+    return results
+
+
+class _Peekable:
+    """可以预览下一个元素的迭代器(元素不能为None, 迭代结束后peek返回None)"""
+
+    def __init__(self, iterable: _typing.Iterable) -> None:
+        self.__iterator = iter(iterable)
+        self.__next = next(self.__iterator, None)
+        # 被放回的元素
+        self.__pushed: _collections.deque = _collections.deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.__next is None:
+            raise StopIteration
+        item = self.__next
+        if self.__pushed:
+            self.__next = self.__pushed.popleft()
+        else:
+            self.__next = next(self.__iterator, None)
+        return item
+
+    def peek(self):
+        return self.__next
+
+    def push(self, items: _typing.Iterable) -> None:
+        """将已取出的items按原顺序放回开头"""
+        items = list(items)
+        if not items:
+            return
+        if self.__next is not None:
+            self.__pushed.appendleft(self.__next)
+        self.__pushed.extendleft(reversed(items[1:]))
+        self.__next = items[0]
+
+
+def _merge_join(
+    left: _typing.Iterable,
+    right: _typing.Iterable,
+    left_key: _typing.Callable = _operator.itemgetter(0),
+    right_key: _typing.Callable = _operator.itemgetter(0),
+) -> _typing.Generator[tuple[_typing.Any, _typing.Any], None, None]:
+    """
+    归并连接两个按键升序排列(且键不重复)的可迭代对象, 生成(left_item, right_item), 缺失的一侧为None
+    """
+    left, right = iter(left), iter(right)
+    end = object()
+    l, r = next(left, end), next(right, end)
+    while l is not end or r is not end:
+        if r is end or (l is not end and left_key(l) < right_key(r)):
+            yield l, None
+            l = next(left, end)
+        elif l is end or left_key(l) > right_key(r):
+            yield None, r
+            r = next(right, end)
+        else:
+            yield l, r
+            l, r = next(left, end), next(right, end)
+
+
+def _batched(
+    iterable: _typing.Iterable, size: int
+) -> _typing.Generator[list, None, None]:
+    """将可迭代对象按顺序切分为长度为size的列表(最后一个可能更短)"""
+    iterator = iter(iterable)
+    while batch := list(_itertools.islice(iterator, size)):
+        yield batch
+
+
+def _ordered_imap(
+    executor: _futures.Executor,
+    func: _typing.Callable,
+    iterable: _typing.Iterable,
+    prefetch: int,
+) -> _typing.Generator[tuple[_typing.Any, _typing.Any], None, None]:
+    """
+    在executor中计算func(item), 按输入顺序生成(item, 结果), 同时最多有prefetch个任务未被取走
+    (与executor.map不同, 不会一次性提交全部任务)
+    """
+    pending: _collections.deque[tuple[_typing.Any, _futures.Future]] = (
+        _collections.deque()
+    )
+    for item in iterable:
+        pending.append((item, executor.submit(func, item)))
+        if len(pending) >= prefetch:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+class _AsyncDirLister:
+    """
+    以asyncio并发列出文件夹并stat其中的项目(scan_backend == "asyncio", 适用于高延迟的网络文件系统)。
+
+    事件循环在单独的线程中运行, scandir和stat在最多concurrency个线程中进行(每个文件夹的项目分块并发stat)。
+    按深度优先的顺序预读: 取走一个文件夹的结果时, 其子文件夹排到预读队列的最前面,
+    已提交而未取走的文件夹不超过readahead个(内存占用有上限)。
+    """
+
+    def __init__(
+        self,
+        list_sorted: _typing.Callable[[str], list[tuple[str, _os.DirEntry | None]]],
+        scan_entry: _typing.Callable[[str, _os.DirEntry, bool], "ScanEntry | None"],
+        concurrency: int = 64,
+        readahead: int = 256,
+        stat_chunk: int = 32,
+    ) -> None:
+        """
+        Parameters
+        ---
+        list_sorted : Callable
+            列出文件夹的项目, 见FolderStatus.__list_sorted
+        scan_entry : Callable
+            由DirEntry生成ScanEntry, 见FolderStatus.__scan_entry
+        concurrency : int, default = 64
+            同时进行的scandir/stat调用数
+        readahead : int, default = 256
+            已提交而未取走的文件夹数上限
+        stat_chunk : int, default = 32
+            每个stat任务包含的项目数
+        """
+        self.__list_sorted = list_sorted
+        self.__scan_entry = scan_entry
+        self.__readahead = max(readahead, 1)
+        self.__stat_chunk = max(stat_chunk, 1)
+        self.__pool = _futures.ThreadPoolExecutor(max(concurrency, 1))
+        self.__loop = _asyncio.new_event_loop()
+        self.__thread = _threading.Thread(target=self.__loop.run_forever, daemon=True)
+        self.__thread.start()
+        self.__submitted: dict[str, _futures.Future] = {}
+        self.__queue: _collections.deque[tuple[str, bool]] = _collections.deque()
+
+    def __scan_chunk(
+        self, reldir: str, stat_dirs: bool, chunk: list[tuple[str, _os.DirEntry | None]]
+    ) -> list[tuple[str, "ScanEntry | None"]]:
+        return [
+            (
+                key,
+                (
+                    None
+                    if dir_entry is None
+                    else self.__scan_entry(reldir + key, dir_entry, stat_dirs)
+                ),
+            )
+            for key, dir_entry in chunk
+        ]
+
+    async def __scan(
+        self, reldir: str, stat_dirs: bool
+    ) -> list[tuple[str, "ScanEntry | None"]]:
+        loop = _asyncio.get_running_loop()
+        keys = await loop.run_in_executor(self.__pool, self.__list_sorted, reldir)
+        parts = await _asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self.__pool, self.__scan_chunk, reldir, stat_dirs, chunk
+                )
+                for chunk in _batched(keys, self.__stat_chunk)
+            )
+        )
+        return [item for part in parts for item in part]
+
+    def __submit(self, reldir: str, stat_dirs: bool) -> _futures.Future:
+        future = _asyncio.run_coroutine_threadsafe(
+            self.__scan(reldir, stat_dirs), self.__loop
+        )
+        self.__submitted[reldir] = future
+        return future
+
+    def __dequeue(self, reldir: str) -> bool:
+        """从预读队列中移除文件夹, 返回是否在队列中"""
+        for idx, (queued, _) in enumerate(self.__queue):
+            if queued == reldir:
+                del self.__queue[idx]
+                return True
+        return False
+
+    def __fill(self):
+        while self.__queue and len(self.__submitted) < self.__readahead:
+            self.__submit(*self.__queue.popleft())
+
+    def scan(
+        self, reldir: str, stat_dirs: bool, readahead: bool = True
+    ) -> list[tuple[str, "ScanEntry | None"]]:
+        """
+        取走文件夹的结果(与FolderStatus.__scan_dir相同), 并预读其子文件夹
+
+        Parameters
+        ---
+        reldir : str
+            文件夹的相对路径(非空时以路径分隔符结尾)
+        stat_dirs : bool
+            是否对文件夹进行stat(预读的子文件夹与之相同)
+        readahead : bool, default = True
+            是否预读子文件夹
+        """
+        future = self.__submitted.pop(reldir, None)
+        if future is None:
+            self.__dequeue(reldir)
+            future = self.__submit(reldir, stat_dirs)
+            del self.__submitted[reldir]
+        result = future.result()
+
+        if readahead:
+            self.__queue.extendleft(
+                (reldir + key, stat_dirs)
+                for key, _ in reversed(result)
+                if key.endswith(_os.sep)
+            )
+        self.__fill()
+        return result
+
+    @staticmethod
+    async def __cancel_all():
+        tasks = [i for i in _asyncio.all_tasks() if i is not _asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await _asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """取消所有预读, 关闭事件循环和线程池"""
+        self.__submitted.clear()
+        self.__queue.clear()
+        _asyncio.run_coroutine_threadsafe(self.__cancel_all(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+        self.__pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _LimitedExecutor(_futures.Executor):
+    """
+    限制同时运行的任务数的执行器(包装另一个执行器, 多个实例可以共用被包装的执行器)。
+    提交时等待空位, 因此被包装的执行器的工作线程不会因等待而被占用。关闭时不关闭被包装的执行器。
+    """
+
+    def __init__(self, executor: _futures.Executor, limit: int) -> None:
+        self.__executor = executor
+        self.__semaphore = _threading.BoundedSemaphore(max(limit, 1))
+
+    def submit(self, fn, /, *args, **kwargs) -> _futures.Future:
+        self.__semaphore.acquire()
+        try:
+            future = self.__executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.__semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self.__semaphore.release())
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        pass
+
+
 class AutoUpdate:
     """半成品, 用于更新旧版的idx"""
 
@@ -12,6 +12,15 @@ import time as _time
 import sqlite3 as _sqlite3
 import re as _re
 import typing as _typing
+import functools as _functools
+import contextlib as _contextlib
+import mmap as _mmap
+import threading as _threading
+import ctypes as _ctypes
+import ctypes.util as _ctypes_util
+import struct as _struct
+import select as _select
+import errno as _errno
 
 # 第三方库
 import yaml as _yaml  # pyyaml
@@ -261,36 +270,190 @@ class Zip_7z_py7zr:
 class Hash:
     """Hashing String And File"""
 
+    # 哈希算法注册表: 算法名 -> 生成哈希对象的函数(哈希对象需要有update和hexdigest方法)
+    algorithms: dict[str, _typing.Callable[[], _typing.Any]] = {}
+    # 旧的数字编号 -> 算法名
+    legacy_types: dict[int | float, str] = {
+        1: "sha1",
+        224: "sha224",
+        256: "sha256",
+        384: "sha384",
+        512: "sha512",
+        5: "md5",
+        3.224: "sha3_224",
+        3.256: "sha3_256",
+        3.384: "sha3_384",
+        3.512: "sha3_512",
+    }
+    # 计算文件哈希时每次读取的字节数
+    buffer_size: int = 1 << 20
+    # 不小于该大小的文件通过mmap直接计算哈希(不复制到缓冲区), 为None则不使用mmap。
+    # 默认不使用: 计算期间文件被截短时, 访问mmap会触发SIGBUS, 使整个进程退出(无法作为异常捕获)
+    mmap_threshold: int | None = None
+    # 本机共用的文件哈希缓存(见HashCache), 为None则不使用, 比如Hash.cache = HashCache()启用
+    cache: "HashCache | None" = None
+    __local = _threading.local()  # 每个线程复用的读取缓冲区
+
+    @classmethod
+    def register(cls, name: str, factory: _typing.Callable[[], _typing.Any]):
+        """
+        注册哈希算法
+
+        Parameters
+        ---
+        name : str
+            算法名
+        factory : Callable[[], HashObject]
+            生成哈希对象的函数
+        """
+        cls.algorithms[name] = factory
+
+    @classmethod
+    def new(cls, hash_type: str | int | float):
+        """
+        生成哈希对象
+
+        Parameters
+        ---
+        hash_type : str | int | float
+            算法名(见Hash.algorithms), 或旧的数字编号(见Hash.legacy_types)
+        """
+        name = cls.legacy_types.get(hash_type, hash_type)
+        try:
+            return cls.algorithms[name]()
+        except KeyError:
+            raise ValueError(f"未知的哈希算法: {hash_type}") from None
+
     @staticmethod
     def geneHashObj(hash_type):
-        if hash_type == 1:
-            return _hashlib.sha1()
-        elif hash_type == 224:
-            return _hashlib.sha224()
-        elif hash_type == 256:
-            return _hashlib.sha256()
-        elif hash_type == 384:
-            return _hashlib.sha384()
-        elif hash_type == 512:
-            return _hashlib.sha512()
-        elif hash_type == 5:
-            return _hashlib.md5()
-        elif hash_type == 3.224:
-            return _hashlib.sha3_224()
-        elif hash_type == 3.256:
-            return _hashlib.sha3_256()
-        elif hash_type == 3.384:
-            return _hashlib.sha3_384()
-        elif hash_type == 3.512:
-            return _hashlib.sha3_512()
-        else:
-            raise Exception("类型错误, 初始化失败")
+        """生成哈希对象(兼容旧接口, 等同于Hash.new)"""
+        return Hash.new(hash_type)
+
+    @classmethod
+    def benchmark(
+        cls,
+        algorithms: _typing.Iterable[str] | None = None,
+        size: int = 256 * 1048576,
+        chunk_size: int = 1048576,
+    ) -> dict[str, float]:
+        """
+        测试各哈希算法在内存数据上的吞吐量
+
+        Parameters
+        ---
+        algorithms : Iterable[str] | None, default = None
+            要测试的算法名, 为None则测试所有已注册的算法
+        size : int, default = 256MiB
+            每个算法处理的数据量
+        chunk_size : int, default = 1MiB
+            每次update的数据块大小
+
+        Returns
+        ---
+        {算法名: 吞吐量(MB/s)}, 按吞吐量降序排列
+        """
+        algorithms = cls.algorithms if algorithms is None else algorithms
+        chunk = memoryview(_os.urandom(chunk_size))
+        rounds = max(size // chunk_size, 1)
+
+        result = {}
+        for name in algorithms:
+            hashobj = cls.new(name)
+            start = _time.perf_counter()
+            for _ in range(rounds):
+                hashobj.update(chunk)
+            hashobj.hexdigest()
+            cost = _time.perf_counter() - start
+            result[name] = rounds * chunk_size / 1e6 / max(cost, 1e-9)
+        return dict(sorted(result.items(), key=lambda i: i[1], reverse=True))
+
+    @classmethod
+    def updateFromFile(
+        cls,
+        hashobj,
+        path: str | _os.PathLike,
+        buffer_size: int | None = None,
+        mmap_threshold: int | None = -1,
+    ):
+        """
+        将文件内容输入哈希对象(不为每个数据块分配新的bytes)
+        - 大文件: mmap后直接输入哈希对象
+        - 其他文件: readinto到线程复用的bytearray, 通过memoryview输入哈希对象
+
+        Parameters
+        ---
+        hashobj : HashObject
+            哈希对象
+        path : str | os.PathLike
+            文件路径
+        buffer_size : int | None, default = None
+            每次读取的字节数, 为None则使用Hash.buffer_size
+        mmap_threshold : int | None, default = -1
+            使用mmap的文件大小下限, 为None则不使用mmap, 为-1则使用Hash.mmap_threshold
+
+        Returns
+        ---
+        hashobj
+        """
+        buffer_size = cls.buffer_size if buffer_size is None else buffer_size
+        mmap_threshold = cls.mmap_threshold if mmap_threshold == -1 else mmap_threshold
+
+        with open(path, "rb", buffering=0) as f:
+            size = _os.fstat(f.fileno()).st_size
+            if mmap_threshold is not None and 0 < size and mmap_threshold <= size:
+                with _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, "madvise"):
+                        mm.madvise(_mmap.MADV_SEQUENTIAL)
+                    view = memoryview(mm)
+                    try:
+                        for offset in range(0, len(mm), buffer_size):
+                            hashobj.update(view[offset : offset + buffer_size])
+                    finally:
+                        view.release()
+                return hashobj
+
+            buffer = getattr(cls.__local, "buffer", None)
+            if buffer is None or len(buffer) != buffer_size:
+                buffer = cls.__local.buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            try:
+                while n := f.readinto(buffer):
+                    hashobj.update(view[:n])
+            finally:
+                view.release()
+        return hashobj
+
+    @classmethod
+    def file_digest(cls, path: str | _os.PathLike, hash_type: str | int | float) -> str:
+        """
+        计算文件哈希(Hex编码)。启用了Hash.cache时先查询缓存,
+        以计算前的stat为键, 计算后stat未变才写入缓存(计算期间被修改的文件不缓存)
+
+        Parameters
+        ---
+        path : str | os.PathLike
+            文件路径
+        hash_type : str | int | float
+            算法名(见Hash.algorithms), 或旧的数字编号(见Hash.legacy_types)
+        """
+        name = cls.legacy_types.get(hash_type, hash_type)
+        cache = cls.cache
+        if cache is None:
+            return cls.updateFromFile(cls.new(name), path).hexdigest()
+
+        stat = _os.stat(path)
+        if (digest := cache.get(stat, name)) is not None:
+            return digest
+        digest = cls.updateFromFile(cls.new(name), path).hexdigest()
+        if HashCache.key_of(_os.stat(path), name) == HashCache.key_of(stat, name):
+            cache.put(stat, name, digest)
+        return digest
 
     @staticmethod
     def fileHash(path, hash_type):
         """计算文件哈希
         :param path: 文件路径
-        :param hash_type: 哈希算法类型
+        :param hash_type: 哈希算法名(见Hash.algorithms), 或旧的数字编号:
             1       sha-1
             224     sha-224
             256      sha-256
@@ -301,13 +464,9 @@ class Hash:
             3.384   sha3-384
             3.512   sha3-512
         """
-        hashObj = Hash.geneHashObj(hash_type)
         if _os.path.isfile(path):
             try:
-                with open(path, "rb") as f:
-                    for byte_block in iter(lambda: f.read(1048576), b""):
-                        hashObj.update(byte_block)
-                    return hashObj.hexdigest()
+                return Hash.file_digest(path, hash_type)
             except Exception as e:
                 raise Exception("%s计算哈希出错: %s" % (path, e))
         else:
@@ -338,7 +497,7 @@ class Hash:
     def bytesHash(bytes_: bytes, hash_type):
         """计算字节串哈希
         :param bytes_: 字节串
-        :param hash_type: 哈希算法类型
+        :param hash_type: 哈希算法名(见Hash.algorithms), 或旧的数字编号:
             1       sha-1
             224     sha-224
             256      sha-256
@@ -354,6 +513,210 @@ class Hash:
         return hashObj.hexdigest()
 
 
+for _name in (
+    "md5",
+    "sha1",
+    "sha224",
+    "sha256",
+    "sha384",
+    "sha512",
+    "sha3_224",
+    "sha3_256",
+    "sha3_384",
+    "sha3_512",
+    "blake2b",
+    "blake2s",
+):
+    Hash.register(_name, _functools.partial(_hashlib.new, _name))
+
+try:
+    import blake3 as _blake3  # blake3(可选)
+
+    Hash.register("blake3", _blake3.blake3)
+except ImportError:
+    pass
+
+try:
+    import xxhash as _xxhash  # xxhash(可选)
+
+    Hash.register("xxh3_64", _xxhash.xxh3_64)
+    Hash.register("xxh3_128", _xxhash.xxh3_128)
+except ImportError:
+    pass
+
+
+class HashCache:
+    """
+    本机共用的文件哈希缓存(SQLite), 以(设备号, inode, 大小, mtime_ns, 算法)为键,
+    同一文件(包括硬链接)再次计算哈希时只需一次stat。
+
+    每个线程(以及fork出的子进程)使用单独的连接。超出max_entries条时按最后使用时间(LRU)删去最旧的记录。
+    缓存出错(比如数据库被长时间锁定)时视为未命中, 不影响哈希的计算。
+    """
+
+    # 记录数上限, 超出时删去最久未使用的记录, 直到剩下max_entries * evict_ratio条
+    max_entries: int = 1_000_000
+    evict_ratio: float = 0.9
+    # 每写入evict_check_interval条检查一次是否超出上限
+    evict_check_interval: int = 1024
+    # 命中时, 距上次使用超过touch_interval秒才更新最后使用时间(减少写入)
+    touch_interval: float = 3600
+
+    def __init__(
+        self,
+        path: str | _os.PathLike | None = None,
+        max_entries: int | None = None,
+    ):
+        """
+        Parameters
+        ---
+        path : str | os.PathLike | None, default = None
+            缓存数据库的路径, 为None则使用HashCache.default_path()
+        max_entries : int | None, default = None
+            记录数上限, 为None则使用HashCache.max_entries
+        """
+        self.path = pathlib.Path(self.default_path() if path is None else path)
+        if max_entries is not None:
+            self.max_entries = max_entries
+        self.__local = _threading.local()
+        self.__lock = _threading.Lock()
+        self.__puts = 0
+
+    @staticmethod
+    def default_path() -> pathlib.Path:
+        """用户缓存文件夹中的hash_cache.db(Windows为%LOCALAPPDATA%, 其他为$XDG_CACHE_HOME或~/.cache)"""
+        if _sys.platform == "win32":
+            base = _os.environ.get("LOCALAPPDATA") or _os.path.expanduser("~")
+        else:
+            base = _os.environ.get("XDG_CACHE_HOME") or _os.path.expanduser("~/.cache")
+        return pathlib.Path(base) / "FileManagementTool" / "hash_cache.db"
+
+    @staticmethod
+    def key_of(stat: _os.stat_result, algorithm: str) -> tuple:
+        """DEV INODE SIZE MTIME_NS ALGO"""
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, algorithm)
+
+    @property
+    def _database(self) -> "DbOperator":
+        """当前线程(进程)的连接"""
+        if getattr(self.__local, "pid", None) != _os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = DbOperator(self.path, timeout=5, profile="bulk-write")
+            db.execute("""CREATE TABLE IF NOT EXISTS HASH_CACHE (
+                DEV INTEGER NOT NULL, INODE INTEGER NOT NULL, SIZE INTEGER NOT NULL,
+                MTIME_NS INTEGER NOT NULL, ALGO TEXT NOT NULL, DIGEST TEXT NOT NULL,
+                LAST_USED DOUBLE NOT NULL,
+                PRIMARY KEY (DEV, INODE, SIZE, MTIME_NS, ALGO)
+                ) WITHOUT ROWID;""")
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS HASH_CACHE_LAST_USED ON HASH_CACHE (LAST_USED);"
+            )
+            db.commit()
+            self.__local.db = db
+            self.__local.pid = _os.getpid()
+        return self.__local.db
+
+    def get(self, stat: _os.stat_result, algorithm: str) -> str | None:
+        """
+        查询缓存
+
+        Parameters
+        ---
+        stat : os.stat_result
+            文件的stat
+        algorithm : str
+            算法名
+
+        Returns
+        ---
+        哈希(Hex编码), 未命中则为None
+        """
+        key = self.key_of(stat, algorithm)
+        where = "DEV = ? AND INODE = ? AND SIZE = ? AND MTIME_NS = ? AND ALGO = ?"
+        try:
+            db = self._database
+            row = db.execute(
+                f"SELECT DIGEST, LAST_USED FROM HASH_CACHE WHERE {where};", key
+            ).fetchone()
+        except (_sqlite3.Error, OSError):
+            return None
+        if row is None:
+            return None
+
+        digest, last_used = row
+        now = _time.time()
+        if now - last_used > self.touch_interval:
+            try:
+                with db.transaction("IMMEDIATE"):
+                    db.execute(
+                        f"UPDATE HASH_CACHE SET LAST_USED = ? WHERE {where};",
+                        (now,) + key,
+                    )
+            except _sqlite3.Error:
+                pass
+        return digest
+
+    def put(self, stat: _os.stat_result, algorithm: str, digest: str):
+        """
+        写入缓存
+
+        Parameters
+        ---
+        stat : os.stat_result
+            计算哈希前文件的stat
+        algorithm : str
+            算法名
+        digest : str
+            哈希(Hex编码)
+        """
+        try:
+            db = self._database
+            with db.transaction("IMMEDIATE"):
+                db.execute(
+                    "INSERT OR REPLACE INTO HASH_CACHE"
+                    " (DEV, INODE, SIZE, MTIME_NS, ALGO, DIGEST, LAST_USED)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    self.key_of(stat, algorithm) + (digest, _time.time()),
+                )
+        except (_sqlite3.Error, OSError):
+            return
+
+        with self.__lock:
+            self.__puts += 1
+            due = self.__puts % self.evict_check_interval == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        超出max_entries条时, 删去最久未使用的记录
+
+        Returns
+        ---
+        删去的记录数
+        """
+        try:
+            db = self._database
+            (count,) = db.execute("SELECT COUNT(*) FROM HASH_CACHE;").fetchone()
+            if count <= self.max_entries:
+                return 0
+            excess = count - int(self.max_entries * self.evict_ratio)
+            with db.transaction("IMMEDIATE"):
+                return db.execute(
+                    "DELETE FROM HASH_CACHE WHERE LAST_USED <= ("
+                    "SELECT LAST_USED FROM HASH_CACHE ORDER BY LAST_USED LIMIT 1 OFFSET ?);",
+                    (excess - 1,),
+                ).rowcount
+        except (_sqlite3.Error, OSError):
+            return 0
+
+    def clear(self):
+        """清空缓存"""
+        db = self._database
+        with db.transaction("IMMEDIATE"):
+            db.execute("DELETE FROM HASH_CACHE;")
+
+
 class StandardAesStringCrypto:
     """
     在线加密解密见https://www.ssleye.com/aes_cipher.html
@@ -423,6 +786,27 @@ class DbOperator(_sqlite3.Connection):
         )
     )
 
+    # 连接配置: 配置名 -> {PRAGMA: 值}
+    profiles: dict[str, dict[str, str | int]] = {
+        "default": {},
+        # 大量写入: WAL日志(读写互不阻塞), 事务提交时不等待落盘(断电可能丢失最近的事务, 但不会损坏数据库)
+        # (临时表保留默认的文件存储: 大量暂存的数据放在内存中会使内存占用随数据量增长)
+        "bulk-write": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1048576,
+            "cache_size": -64 * 1024,  # 负数代表KiB
+        },
+        # 以查询为主: 更大的mmap和页缓存
+        "read-mostly": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "temp_store": "MEMORY",
+            "mmap_size": 1024 * 1048576,
+            "cache_size": -256 * 1024,
+        },
+    }
+
     @classmethod
     def check_name_normal(cls, name: str):
         """检查名字仅含[a-zA-Z0-9_]且并非关键字"""
@@ -436,9 +820,11 @@ class DbOperator(_sqlite3.Connection):
         self,
         database: str | bytes | _os.PathLike[str] | _os.PathLike[bytes],
         *args,
+        profile: str | None = None,
         **kwargs,
     ):
         """
+        profile: str | None = None, 连接配置(见DbOperator.profiles)
         database: str | bytes | os.PathLike[str] | os.PathLike[bytes],
         timeout: float = ...,
         detect_types: int = ...,
@@ -449,6 +835,61 @@ class DbOperator(_sqlite3.Connection):
         uri: bool = ...,
         """
         super().__init__(database, *args, **kwargs)
+        self.__savepoint_count = 0
+        if profile is not None:
+            self.use_profile(profile)
+
+    def use_profile(self, profile: str):
+        """
+        应用连接配置(不能在事务中调用)
+
+        Parameters
+        ---
+        profile : str
+            配置名, 见DbOperator.profiles
+        """
+        try:
+            pragmas = self.profiles[profile]
+        except KeyError:
+            raise ValueError(f"未知的连接配置: {profile}") from None
+        for key, value in pragmas.items():
+            self.execute(f"PRAGMA {key} = {value};")
+
+    @_contextlib.contextmanager
+    def transaction(
+        self, mode: _typing.Literal["DEFERRED", "IMMEDIATE", "EXCLUSIVE"] = "DEFERRED"
+    ) -> _typing.Generator["DbOperator", None, None]:
+        """
+        事务: 代码块正常结束则commit, 出现异常则rollback。
+        嵌套使用时, 内层为SAVEPOINT(出现异常只回滚内层)
+
+        Parameters
+        ---
+        mode : "DEFERRED" | "IMMEDIATE" | "EXCLUSIVE", default = "DEFERRED"
+            最外层事务的类型
+        """
+        if self.in_transaction:
+            self.__savepoint_count += 1
+            name = f"SP_{self.__savepoint_count}"
+            self.execute(f"SAVEPOINT {name};")
+            try:
+                yield self
+            except BaseException:
+                self.execute(f"ROLLBACK TO {name};")
+                self.execute(f"RELEASE {name};")
+                raise
+            else:
+                self.execute(f"RELEASE {name};")
+            return
+
+        self.execute(f"BEGIN {mode};")
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        else:
+            self.commit()
 
     def __enter__(self):
         return self
@@ -498,7 +939,9 @@ class DbOperator(_sqlite3.Connection):
             self.rollback()
             raise e
 
-    def create_table(self, table: str, columns: list[tuple[str]]) -> _sqlite3.Cursor:
+    def create_table(
+        self, table: str, columns: list[tuple[str]], options: str = ""
+    ) -> _sqlite3.Cursor:
         """
         创建表(如果表已存在, 则不执行创建)
 
@@ -510,6 +953,8 @@ class DbOperator(_sqlite3.Connection):
             表名
         columns : list[tuple[str]]
             列属性, 应为(name, type, *constraints)
+        options : str, default = ""
+            表选项(比如"WITHOUT ROWID")
         """
 
         def fcolumn(column: tuple[str]):
@@ -518,7 +963,7 @@ class DbOperator(_sqlite3.Connection):
 
         columns = ",\n".join(map(fcolumn, columns))
 
-        sentence = f"CREATE TABLE IF NOT EXISTS '{table}' ({columns});"
+        sentence = f"CREATE TABLE IF NOT EXISTS '{table}' ({columns}) {options};"
         return self.try_exe(sentence)
 
     def select(
@@ -564,6 +1009,7 @@ class DbOperator(_sqlite3.Connection):
         column_name: str | _typing.Iterable[str],
         data: list[tuple[_typing.Any]],
         clause: str = "",
+        commit: bool = True,
     ) -> _sqlite3.Cursor:
         """
         插入
@@ -580,6 +1026,8 @@ class DbOperator(_sqlite3.Connection):
             tuple[Any]代表单行数据包装为一个元组
         clause : str
             子句
+        commit : bool, default = True
+            是否自动commit(为False时由调用者管理事务)
         """
         if isinstance(column_name, str):
             column_name = f"('{column_name}')"
@@ -590,11 +1038,222 @@ class DbOperator(_sqlite3.Connection):
             column_name = f"({column_name})"
 
         sentence = f"INSERT INTO '{table}' {column_name} VALUES {placeholder} {clause};"
+        if not commit:
+            return self.executemany(sentence, data)
         return self.try_exemany(sentence, data)
 
     _update = "UPDATE table SET column_name1 = ? where column_name2 = ?;"
 
 
+class Inotify:
+    """
+    Linux inotify的简单封装(通过ctypes调用libc, 不依赖第三方库)
+
+    add_tree递归监视文件夹: 为每个子文件夹添加监视(不进入指向文件夹的符号链接),
+    新建、移入的子文件夹自动添加监视, 在监视范围内移动的文件夹自动更新路径。
+    """
+
+    # 事件掩码(见inotify(7))
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_EXCL_UNLINK = 0x04000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    # 监视的事件: 内容写入完成、元数据变化、增删、移动
+    watch_mask: int = (
+        IN_MODIFY
+        | IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+    )
+    # 每次读取事件的缓冲区大小
+    buffer_size: int = 1 << 16
+    __event_header = _struct.Struct("iIII")  # wd mask cookie len
+
+    def __init__(self):
+        """
+        Raises
+        ---
+        OSError
+            当前系统不支持inotify, 或创建inotify实例失败
+        """
+        libc = _ctypes.CDLL(_ctypes_util.find_library("c"), use_errno=True)
+        try:
+            self.__add_watch = libc.inotify_add_watch
+            self.__rm_watch = libc.inotify_rm_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError("当前系统不支持inotify") from None
+        self.__add_watch.argtypes = [_ctypes.c_int, _ctypes.c_char_p, _ctypes.c_uint32]
+        self.__rm_watch.argtypes = [_ctypes.c_int, _ctypes.c_int]
+
+        fd = init(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            errno = _ctypes.get_errno()
+            raise OSError(errno, _os.strerror(errno))
+        self.__fd: int = fd
+        self.__watches: dict[int, str] = {}  # wd -> 文件夹路径
+
+    def fileno(self) -> int:
+        return self.__fd
+
+    def close(self):
+        if self.__fd >= 0:
+            _os.close(self.__fd)
+            self.__fd = -1
+            self.__watches.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def watch_count(self) -> int:
+        """监视的文件夹数"""
+        return len(self.__watches)
+
+    def add_watch(self, path: str | _os.PathLike[str]) -> int | None:
+        """
+        监视文件夹(不包括子文件夹)
+
+        Returns
+        ---
+        监视描述符, 文件夹不存在(或不是文件夹)则返回None
+
+        Raises
+        ---
+        OSError
+            超出监视数量上限(/proc/sys/fs/inotify/max_user_watches)等
+        """
+        path = _os.fspath(path)
+        wd = self.__add_watch(
+            self.__fd,
+            _os.fsencode(path),
+            self.watch_mask
+            | self.IN_ONLYDIR
+            | self.IN_DONT_FOLLOW
+            | self.IN_EXCL_UNLINK,
+        )
+        if wd < 0:
+            errno = _ctypes.get_errno()
+            if errno in (_errno.ENOENT, _errno.ENOTDIR, _errno.EACCES):
+                return None
+            raise OSError(errno, _os.strerror(errno), path)
+        self.__watches[wd] = path
+        return wd
+
+    def add_tree(self, path: str | _os.PathLike[str]) -> int:
+        """
+        监视文件夹及其所有子文件夹
+
+        Returns
+        ---
+        添加监视的文件夹数
+        """
+        count = 0
+        for root, _, _ in _os.walk(path):
+            if self.add_watch(root) is not None:
+                count += 1
+        return count
+
+    def __remove_tree(self, path: str):
+        """移除文件夹及其子文件夹的监视(文件夹被移出了监视范围)"""
+        prefix = path + _os.sep
+        for wd, watch_path in list(self.__watches.items()):
+            if watch_path == path or watch_path.startswith(prefix):
+                self.__rm_watch(self.__fd, wd)
+                del self.__watches[wd]
+
+    def __rename_tree(self, old_path: str, new_path: str):
+        """更新在监视范围内移动的文件夹及其子文件夹的路径"""
+        prefix = old_path + _os.sep
+        for wd, watch_path in self.__watches.items():
+            if watch_path == old_path:
+                self.__watches[wd] = new_path
+            elif watch_path.startswith(prefix):
+                self.__watches[wd] = new_path + watch_path[len(old_path) :]
+
+    def read_events(self, timeout: float | None = None) -> list[tuple[str | None, int]]:
+        """
+        读取事件
+
+        Parameters
+        ---
+        timeout : float | None, default = None
+            没有事件时最多等待的秒数, 为None则一直等待
+
+        Returns
+        ---
+        [(路径, 事件掩码), ...], 没有事件则为空列表。
+        事件队列溢出(丢失了事件)时, 路径为None, 掩码包含IN_Q_OVERFLOW。
+        """
+        readable, _, _ = _select.select([self.__fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            # 每次读取只返回完整的事件, 剩余的事件留给下一次读取
+            data = _os.read(self.__fd, self.buffer_size)
+        except BlockingIOError:
+            return []
+
+        events: list[tuple[str | None, int]] = []
+        moved_from: dict[int, str] = {}  # cookie -> 移出的文件夹路径
+        header = self.__event_header
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = header.unpack_from(data, offset)
+            offset += header.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            if mask & self.IN_IGNORED:
+                self.__watches.pop(wd, None)
+                continue
+            if (watch_path := self.__watches.get(wd)) is None:
+                continue
+            path = _os.path.join(watch_path, _os.fsdecode(name)) if name else watch_path
+            events.append((path, mask))
+
+            if not mask & self.IN_ISDIR:
+                continue
+            if mask & self.IN_MOVED_FROM:
+                moved_from[cookie] = path
+            elif mask & self.IN_MOVED_TO and cookie in moved_from:
+                self.__rename_tree(moved_from.pop(cookie), path)
+            elif mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                # 新建或从监视范围外移入的文件夹
+                self.add_tree(path)
+
+        # 移出监视范围的文件夹
+        for path in moved_from.values():
+            self.__remove_tree(path)
+        return events
+
+
 class Easy7zWrite(py7zr.SevenZipFile):
     """用于写入的SevenZipFile, 仅提供无压缩、可选加密的写入功能"""
 
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import pytest
+
+from package import file_management as fm
+
+
+def write_files(root, files: dict[str, bytes]):
+    for relpath, data in files.items():
+        path = root / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def status_rows(folder_status: fm.FolderStatus) -> dict[str, tuple]:
+    return {
+        row[0]: row
+        for row in folder_status._database.select(
+            "STATUS", fm.FolderStatus._status_column_name
+        )
+    }
+
+
+@pytest.fixture
+def folder(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    return root, tmp_path / "status.db"
+
+
+@pytest.fixture
+def hash_calls(monkeypatch):
+    """记录计算了哈希的文件"""
+    calls = []
+    cal_hash = fm.FolderStatus._cal_hash
+
+    def counting(path, *args, **kwargs):
+        calls.append(os.path.basename(path))
+        return cal_hash(path, *args, **kwargs)
+
+    monkeypatch.setattr(fm.FolderStatus, "_cal_hash", staticmethod(counting))
+    return calls
+
+
+def test_migrate_from_1_1_0(folder, hash_calls):
+    root, dbpath = folder
+    files = {"a.txt": b"a", os.path.join("d", "b.txt"): b"bb"}
+    write_files(root, files)
+    time.sleep(0.01)
+
+    # FSDB 1.1.0的表结构
+    con = sqlite3.connect(dbpath)
+    con.execute(
+        "CREATE TABLE STATUS (PATH TEXT NOT NULL, ISFILE TINYINT NOT NULL,"
+        " SHA256 CHARACTER(64), SIZE BIGINT);"
+    )
+    con.execute(
+        "CREATE TABLE INFO (TIME DOUBLE NOT NULL, ROOT TEXT, MAC TEXT,"
+        " COMMENT TEXT, VERSION TEXT);"
+    )
+    con.execute(
+        "CREATE TABLE VARIANCE (PATH TEXT NOT NULL, ISFILE TINYINT NOT NULL,"
+        " SHA256 CHARACTER(64), SIZE BIGINT, TIME DOUBLE NOT NULL,"
+        " CHANGE TINYINT NOT NULL);"
+    )
+    now = time.time()
+    rows = [("d", False, None, None)] + [
+        (relpath, True, hashlib.sha256(data).hexdigest(), len(data))
+        for relpath, data in files.items()
+    ]
+    con.executemany("INSERT INTO STATUS VALUES (?, ?, ?, ?);", rows)
+    con.executemany(
+        "INSERT INTO VARIANCE VALUES (?, ?, ?, ?, ?, 1);",
+        [row + (now,) for row in rows],
+    )
+    con.execute("INSERT INTO INFO VALUES (?, ?, '', '', '1.1.0');", (now, str(root)))
+    con.commit()
+    con.close()
+
+    folder_status = fm.FolderStatus(root, dbpath)
+    versions = list(folder_status._database.select("SCHEMA_VERSION", "VERSION"))
+    assert sorted(versions) == [("1.1.0",), (fm.FSDB_VERSION,)]
+    assert {r[0]: r[10] for r in status_rows(folder_status).values()} == {
+        "a.txt": "sha256",
+        "d": None,
+        os.path.join("d", "b.txt"): "sha256",
+    }
+
+    # 未变动的文件沿用迁移前的哈希, 且没有变化
+    folder_status.update_database()
+    assert hash_calls == []
+    time_ = folder_status._database.execute("SELECT MAX(TIME) FROM INFO").fetchone()[0]
+    assert not folder_status._database.select(
+        "VARIANCE", "PATH", "WHERE TIME = ?", (time_,)
+    ).fetchall()
+    # 文件元数据已补全
+    assert all(r[4] is not None for r in status_rows(folder_status).values() if r[1])
+    folder_status.close()
+
+
+def last_update_time(folder_status: fm.FolderStatus) -> float:
+    return folder_status._database.execute("SELECT MAX(TIME) FROM INFO").fetchone()[0]
+
+
+def snapshot_paths(folder_status: fm.FolderStatus, time_: float) -> list[str]:
+    return [row[0] for row in folder_status.snapshot_at(time_)]
+
+
+@pytest.mark.parametrize("layout", ["plain", "normalized"])
+@pytest.mark.parametrize("checkpoint", [False, True])
+def test_compact_history_then_snapshot(folder, layout, checkpoint):
+    root, dbpath = folder
+
+    def update() -> tuple[fm.FolderStatus, float]:
+        time.sleep(0.01)
+        folder_status = fm.FolderStatus(root, dbpath)
+        folder_status.path_layout = layout
+        folder_status.checkpoint_interval = None
+        folder_status.checkpoint_variance_rows = None
+        folder_status.update_database()
+        return folder_status, last_update_time(folder_status)
+
+    write_files(root, {"keep": b"k"})
+    update()
+    write_files(root, {"x": b"x"})
+    folder_status, t1 = update()
+    if checkpoint:
+        folder_status.write_checkpoint()
+    (root / "x").unlink()
+    folder_status, t2 = update()
+    for i in range(3):
+        write_files(root, {"keep": str(i).encode()})
+        folder_status, t3 = update()
+
+    assert snapshot_paths(folder_status, t1) == ["keep", "x"]
+    later = {t: snapshot_paths(folder_status, t) for t in (t2, t3)}
+    report = folder_status.compact_history(t2, vacuum=None)
+
+    # cutoff(含)之后的历史查询结果不变, 且不会从已删去的检查点前滚
+    assert {t: snapshot_paths(folder_status, t) for t in (t2, t3)} == later
+    assert later[t2] == ["keep"]
+    assert report["checkpoints"] == int(checkpoint)
+    assert folder_status._database.select("CHECKPOINT", "COUNT(*)").fetchone() == (0,)
+    folder_status.close()
+
+
+@pytest.mark.parametrize("layout", ["plain", "normalized"])
+def test_record_moves(folder, layout):
+    root, dbpath = folder
+    sep = os.sep
+    write_files(root, {f"a{sep}x.txt": b"x", f"a{sep}y.txt": b"y", "z.txt": b"z"})
+    folder_status = fm.FolderStatus(root, dbpath)
+    folder_status.path_layout = layout
+    folder_status.update_database()
+    start = last_update_time(folder_status) + 1e-6
+
+    time.sleep(0.01)
+    os.rename(root / "a", root / "b")
+    write_files(root, {"z.txt": b"changed", "copy.txt": b"x"})
+    folder_status.update_database()
+    rows = folder_status._database.select(
+        "VARIANCE", ("PATH", "CHANGE", "OLDPATH"), "WHERE TIME >= ?", (start,)
+    ).fetchall()
+    # 移动的文件只记录一条(新路径, 原路径), 内容相同的新文件仍为新增
+    moves = sorted((path, oldpath) for path, change, oldpath in rows if change == 2)
+    assert moves == [(f"b{sep}x.txt", f"a{sep}x.txt"), (f"b{sep}y.txt", f"a{sep}y.txt")]
+    assert f"a{sep}x.txt" not in {path for path, _, _ in rows}
+    assert ("copy.txt", 1, None) in rows
+
+    time.sleep(0.01)
+    os.rename(root / "b", root / "c")
+    folder_status.update_database()
+    added, deleted, moved = folder_status.combine_variance(start, moves=True)
+    # 连续的移动合并为一条
+    assert sorted((row[0], row[7]) for row in moved) == [
+        (f"c{sep}x.txt", f"a{sep}x.txt"),
+        (f"c{sep}y.txt", f"a{sep}y.txt"),
+    ]
+    # 原路径不再出现在deleted中(中间路径"b"的最后一次记录为删去)
+    assert sorted(row[0] for row in added) == ["c", "copy.txt", "z.txt"]
+    assert sorted(row[0] for row in deleted) == [
+        "a",
+        "b",
+        f"b{sep}x.txt",
+        f"b{sep}y.txt",
+        "z.txt",
+    ]
+    folder_status.close()
+
+
+class Interrupted(BaseException):
+    """模拟扫描被中断(不会被扫描过程捕获)"""
+
+
+def test_resume_interrupted_scan(folder, monkeypatch):
+    root, dbpath = folder
+    files = {f"f{i:02}": str(i).encode() for i in range(20)}
+    write_files(root, files)
+    monkeypatch.setattr(fm.FolderStatus, "work_unit_size", 4)
+    hashed = []
+    interrupt_at = [12]
+    cal_hash = fm.FolderStatus._cal_hash
+
+    def interrupting(path, *args, **kwargs):
+        hashed.append(os.path.basename(path))
+        if len(hashed) == interrupt_at[0]:
+            raise Interrupted
+        return cal_hash(path, *args, **kwargs)
+
+    monkeypatch.setattr(fm.FolderStatus, "_cal_hash", staticmethod(interrupting))
+    folder_status = fm.FolderStatus(root, dbpath)
+    with pytest.raises(Interrupted):
+        folder_status.update_database()
+    folder_status.close()
+
+    folder_status = fm.FolderStatus(root, dbpath)
+    progress = {
+        path for (path,) in folder_status._database.select("SCAN_PROGRESS", "PATH")
+    }
+    assert progress and progress <= set(hashed[:-1])
+
+    # 继续扫描: 沿用已计算的哈希, 期间变动的文件重新计算
+    time.sleep(0.01)
+    files["f01"] = b"changed"
+    write_files(root, {"f01": files["f01"]})
+    hashed.clear()
+    interrupt_at[0] = None
+    folder_status.update_database()
+    assert sorted(hashed) == sorted(set(files) - progress | {"f01"})
+    assert folder_status._database.select("SCAN_PROGRESS", "COUNT(*)").fetchone() == (
+        0,
+    )
+    rows = status_rows(folder_status)
+    assert {path: rows[path][2] for path in files} == {
+        path: hashlib.sha256(data).hexdigest() for path, data in files.items()
+    }
+    folder_status.close()